@@ -0,0 +1,199 @@
+import asyncio
+import concurrent.futures
+import dataclasses
+import datetime
+import io
+import logging
+import math
+import signal
+from pathlib import Path
+from typing import BinaryIO, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+import pandas as pd
+import pdfplumber
+
+from insurancedb.exporters.normalize import parse_amounts
+from insurancedb.extractors.base import BaseRcaExtractor
+from insurancedb.extractors.extractor_methods import diff_months, load_template, resources_dir
+from insurancedb.extractors.options import ExtractionOptions, select_fields
+from insurancedb.extractors.pdf_file import open_pdf
+from insurancedb.extractors.page_reader import load_scaled_template
+from insurancedb.extractors.registry import select_specs
+from insurancedb.file_processor import extract_pdf
+
+logger = logging.getLogger(__name__)
+
+# a path, the pdf bytes or a binary file object
+Source = Union[str, Path, bytes, BinaryIO]
+
+
+class Policy(NamedTuple):
+    """One extracted policy, with the values normalized the way the exporter writes them to db.csv."""
+    insurer: Optional[str]
+    insurance_number: Optional[str]
+    insurance_class: Optional[str]
+    contract_date: Optional[datetime.date]
+    start_date: Optional[datetime.date]
+    expiration_date: Optional[datetime.date]
+    person_name: Optional[str]
+    type: Optional[str]
+    car_number: Optional[str]
+    amount: Optional[float]
+    file_name: str
+
+    @property
+    def insurance_months(self) -> Optional[int]:
+        return diff_months(self.expiration_date, self.start_date)
+
+    @classmethod
+    def from_extractor(cls, extractor: BaseRcaExtractor, file_name: str,
+                       options: Optional[ExtractionOptions] = None) -> 'Policy':
+        """The fields not selected by options.fields are None."""
+
+        def get(field):
+            return extractor.get_field(field) if options is None or options.wants(field) else None
+
+        amount = parse_amounts(pd.Series([get('amount')], dtype=object))[0]
+        return cls(insurer=get('insurer'), insurance_number=get('insurance_number'),
+                   insurance_class=get('insurance_class'), contract_date=get('contract_date'),
+                   start_date=get('start_date'), expiration_date=get('expiration_date'),
+                   person_name=get('person_name'), type=get('type'),
+                   car_number=get('car_number'), amount=None if math.isnan(amount) else float(amount),
+                   file_name=file_name)
+
+
+def with_fields(options: Optional[ExtractionOptions], fields: Optional[Iterable[str]]) -> ExtractionOptions:
+    """The options, the defaults without them, with the fields selected, ValueError for an unknown field."""
+    options = options if options is not None else ExtractionOptions()
+    return options if fields is None else dataclasses.replace(options, fields=select_fields(fields))
+
+
+def _open_pdf(source: Source, file_name: Optional[str], use_mmap: bool = False):
+    """pdfplumber pdf and the file name the extractors probe, which is required when the source has no name."""
+    if isinstance(source, (str, Path)):
+        return open_pdf(source, use_mmap), file_name or Path(source).name
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    if file_name is None:
+        file_name = Path(getattr(source, 'name', '')).name
+    if not file_name:
+        raise ValueError("file_name is required, the extractors recognize the insurer from it")
+    return pdfplumber.open(source), file_name
+
+
+class Extractor:
+    """
+    Extraction session for a long running process, e.g. a web backend. The extractor classes of options.insurers and
+    the OCR templates, also scaled to the resolutions of the options, are loaded once when the session is created
+    instead of on the first document.
+
+        extractor = Extractor()
+        policy = extractor.extract(upload.read(), file_name=upload.filename)
+
+    A session only holds read-only state, it can be used from several threads. With fields, e.g. ['car_number',
+    'expiration_date'], only those fields are extracted, the OCR crops of the others are skipped.
+    """
+
+    def __init__(self, options: Optional[ExtractionOptions] = None, fields: Optional[Iterable[str]] = None):
+        self.options = with_fields(options, fields)
+        self.specs = select_specs(self.options.insurers)
+        self._warm_up()
+
+    def _warm_up(self):
+        for spec in self.specs:
+            spec.load()
+        resolutions = {self.options.resolution, self.options.low_resolution, self.options.probe_resolution}
+        for template_path in resources_dir.glob('*.png'):
+            load_template(template_path.name)
+            for resolution in resolutions:
+                load_scaled_template(template_path.name, resolution)
+
+    def extract(self, source: Source, file_name: Optional[str] = None) -> Optional[Policy]:
+        """The policy in the pdf, None when no extractor handles it."""
+        pdf, file_name = _open_pdf(source, file_name, self.options.mmap_input)
+        with pdf:
+            extractor = extract_pdf(file_name, pdf, self.options, self.specs)
+            if extractor is None:
+                logger.info("No extractor for %s.", file_name)
+                return None
+            logger.info("%s :-> %s", extractor.__class__.__name__, file_name)
+            return Policy.from_extractor(extractor, file_name, self.options)
+
+
+# session of a pool worker process
+_worker_extractor: Optional[Extractor] = None
+
+
+def _init_worker(options: Optional[ExtractionOptions]):
+    global _worker_extractor
+    # ctrl+c stops the caller, which shuts the pool down, not the workers in the middle of a document
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _worker_extractor = Extractor(options)
+
+
+def _extract_in_worker(data: bytes, file_name: str) -> Optional[Policy]:
+    return _worker_extractor.extract(data, file_name)
+
+
+def _extract_batch_in_worker(items: List[Tuple[bytes, str]]) -> List[Union[Policy, None, Exception]]:
+    """One result per item, a failing document is returned as its exception instead of failing the whole batch."""
+    results = []
+    for data, file_name in items:
+        try:
+            results.append(_worker_extractor.extract(data, file_name))
+        except Exception as e:
+            logger.exception("Could not extract %s.", file_name)
+            results.append(e)
+    return results
+
+
+class PoolExtractor:
+    """
+    Runs the extraction in a pool of worker processes, each with its own warm Extractor session, so OCR documents do
+    not block the caller. submit can be called from any thread, extract_async awaits the result in asyncio code.
+
+        with PoolExtractor(workers=4) as extractor:
+            policy = await extractor.extract_async(data, file_name)
+    """
+
+    def __init__(self, options: Optional[ExtractionOptions] = None, workers: Optional[int] = None,
+                 fields: Optional[Iterable[str]] = None):
+        self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                                                initargs=(with_fields(options, fields),))
+
+    def submit(self, source: Source, file_name: Optional[str] = None) -> 'concurrent.futures.Future[Optional[Policy]]':
+        data, file_name = _read_source(source, file_name)
+        return self._executor.submit(_extract_in_worker, data, file_name)
+
+    def submit_batch(self, items: List[Tuple[bytes, str]]) -> 'concurrent.futures.Future[List]':
+        """(pdf bytes, file name) items extracted by one worker, in one round trip."""
+        return self._executor.submit(_extract_batch_in_worker, items)
+
+    def extract(self, source: Source, file_name: Optional[str] = None) -> Optional[Policy]:
+        return self.submit(source, file_name).result()
+
+    async def extract_async(self, source: Source, file_name: Optional[str] = None) -> Optional[Policy]:
+        return await asyncio.wrap_future(self.submit(source, file_name))
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _read_source(source: Source, file_name: Optional[str]):
+    """The pdf bytes and file name, the bytes are sent to the worker instead of an open file."""
+    if isinstance(source, (str, Path)):
+        return Path(source).read_bytes(), file_name or Path(source).name
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        data = bytes(source)
+    else:
+        data = source.read()
+        file_name = file_name or Path(getattr(source, 'name', '')).name
+    if not file_name:
+        raise ValueError("file_name is required, the extractors recognize the insurer from it")
+    return data, file_name
@@ -0,0 +1,119 @@
+import io
+import pathlib
+import sys
+import time
+import tracemalloc
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Tuple
+
+import click
+import pandas as pd
+
+from insurancedb.exporters.file_exporter import to_db_frame, FLOAT_FORMAT
+from insurancedb.exporters.normalize import normalize, COLUMNS
+from insurancedb.extractors.options import PROFILES
+from insurancedb.file_processor import process_paths
+from insurancedb.utils import DefaultCommandGroup
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports KiB, macOS bytes
+    return max_rss / (1024 * 1024) if sys.platform == 'darwin' else max_rss / 1024
+
+
+def _measure_document(pdf_path: Path):
+    baseline_rss = _peak_rss_mb()
+    tracemalloc.start()
+    start = time.perf_counter()
+    row = process_paths([pdf_path]).row(0)
+    elapsed = time.perf_counter() - start
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"PDF": pdf_path.name, "ASIGURATOR": row[0], "SECONDS": round(elapsed, 2),
+            "PEAK RSS MB": _peak_rss_mb(), "BASELINE RSS MB": baseline_rss,
+            "PEAK TRACED MB": round(traced_peak / (1024 * 1024), 1)}
+
+
+@click.group(cls=DefaultCommandGroup, default_command='memory')
+def bench():
+    pass
+
+
+@bench.command('memory')
+@click.argument('pdfs_dir', type=click.Path(path_type=pathlib.Path, exists=True), required=True)
+@click.option('--limit', type=int, default=None, help='Only measure the first N pdfs.')
+def bench_memory(pdfs_dir: Path, limit: int):
+    """
+    Peak memory per OCR document. Every pdf is processed in a fresh worker process so ru_maxrss is the peak of that
+    document alone, BASELINE RSS MB is the same process before processing (interpreter + imports).
+    """
+    paths = sorted(pdfs_dir.rglob("*.pdf"))[:limit]
+    results = []
+    for pdf_path in paths:
+        with Pool(1, maxtasksperchild=1) as pool:
+            results.append(pool.apply(_measure_document, (pdf_path,)))
+    df = pd.DataFrame(results)
+    with pd.option_context('display.max_rows', None, 'display.width', 200):
+        print(df)
+        if not df.empty:
+            print(df[["SECONDS", "PEAK RSS MB", "PEAK TRACED MB"]].describe())
+
+
+# fields that are not extracted or identify the document
+UNSCORED_COLUMNS = ["NUMAR DE TELEFON", "POLITA PDF"]
+
+
+def _as_db_text(df: pd.DataFrame) -> pd.DataFrame:
+    """Every value as the text db.csv shows for it, indexed by pdf file name."""
+    df = pd.read_csv(io.StringIO(df.to_csv(index=False, float_format=FLOAT_FORMAT)), dtype=str, keep_default_na=False)
+    df.index = [Path(pdf.split(" | ")[0]).name for pdf in df["POLITA PDF"]]
+    return df
+
+
+def field_accuracy(extracted: pd.DataFrame, labels: pd.DataFrame) -> pd.Series:
+    """Share of the labeled pdfs whose extracted value of the field equals the label, empty labels included."""
+    extracted = _as_db_text(extracted)
+    labels = _as_db_text(labels.drop(columns=["NR.CRT"], errors='ignore'))
+    columns = [c for c in COLUMNS if c not in UNSCORED_COLUMNS]
+    # a labeled pdf missing from the extracted rows counts as wrong in every field
+    extracted = extracted[~extracted.index.duplicated()].reindex(labels.index).fillna("\0")
+    return (extracted[columns] == labels[columns]).mean()
+
+
+@bench.command('profiles')
+@click.argument('pdfs_dir', type=click.Path(path_type=pathlib.Path, exists=True), required=True)
+@click.argument('labels_csv', type=click.Path(path_type=pathlib.Path, exists=True, dir_okay=False), required=True)
+@click.option('--profile', 'profiles', type=click.Choice(list(PROFILES)), multiple=True,
+              help='Profiles to measure, all by default.')
+def bench_profiles(pdfs_dir: Path, labels_csv: Path, profiles: Tuple[str]):
+    """
+    Throughput and field accuracy of the extraction profiles on a labeled sample. LABELS_CSV is a db.csv of the
+    sample pdfs corrected by hand, rows are matched to the pdfs by the file name in POLITA PDF.
+    """
+    labels = pd.read_csv(labels_csv, dtype=str, keep_default_na=False)
+    paths = sorted(pdfs_dir.rglob("*.pdf"))
+    results = []
+    for profile in profiles or PROFILES:
+        start = time.perf_counter()
+        batch = process_paths(paths, PROFILES[profile])
+        elapsed = time.perf_counter() - start
+        accuracy = field_accuracy(to_db_frame(normalize(batch.to_frame())), labels)
+        results.append({"PROFILE": profile, "PDFS": len(paths), "SECONDS": round(elapsed, 2),
+                        "PDFS/S": round(len(paths) / elapsed, 2) if elapsed else None,
+                        "ACCURACY": round(accuracy.mean(), 3), **accuracy.round(3).to_dict()})
+    df = pd.DataFrame(results).set_index("PROFILE")
+    with pd.option_context('display.max_columns', None, 'display.width', 200):
+        print(df.T)
+
+
+if __name__ == '__main__':
+    bench()
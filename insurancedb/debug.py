@@ -6,10 +6,9 @@ import pdfplumber
 import cv2
 import pytesseract
 from pytesseract import Output
-import numpy as np
 
 from insurancedb.extractors.simple import AsiromRcaExtractor
-from insurancedb.extractors.extractor_methods import get_pdf_page_image, get_pdf_page_text, contains_unparsable_characters
+from insurancedb.extractors.extractor_methods import get_pdf_page_buffer, get_pdf_page_text, contains_unparsable_characters
 
 
 @click.command()
@@ -17,11 +16,11 @@ from insurancedb.extractors.extractor_methods import get_pdf_page_image, get_pdf
 def debug_ocr(pdf: Path):
     with pdfplumber.open(pdf) as pdf_file:
         custom_config = r'-l ron --psm 6'
-        pil_img = get_pdf_page_image(pdf_file, 2)
-        img = np.array(pil_img)
-        img = img[:, :, ::-1].copy()
-        d = pytesseract.image_to_data(img, config=custom_config, output_type=Output.DICT)
-        print(pytesseract.image_to_string(img, config=custom_config))
+        page = get_pdf_page_buffer(pdf_file, 2)
+        d = pytesseract.image_to_data(page.array, config=custom_config, output_type=Output.DICT)
+        print(pytesseract.image_to_string(page.array, config=custom_config))
+        # the only copy of the page, the boxes are drawn on it
+        img = cv2.cvtColor(page.array, cv2.COLOR_RGB2BGR)
         n_boxes = len(d['text'])
         for i in range(n_boxes):
             # if int(d['conf'][i]) > 60:
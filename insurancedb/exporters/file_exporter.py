@@ -1,13 +1,84 @@
+import io
+import json
+
+import numpy as np
 import pandas as pd
 
+from insurancedb.exporters.normalize import normalize, export_columns, FIELDS_COLUMN
+from insurancedb.plate_index import PlateIndex
+
+FLOAT_FORMAT = '%.2f'
+OCR_FIELDS_FILE = 'ocr_fields.csv'
+OCR_FIELDS_COLUMNS = ["POLITA PDF", "CAMP", "TEXT", "INCREDERE"]
+
+
+def to_csv(batch, out_dir, fields=None):
+    """Writes db.csv with the columns of the selected fields, all of them when fields is None."""
+    frame = batch.to_frame()
+    fields_frame(frame).to_csv(str(out_dir / OCR_FIELDS_FILE), index=False, encoding='utf-8')
+    df = normalize(frame)
+    PlateIndex.from_frame(df).save(out_dir)
+    to_db_frame(df)[export_columns(fields)].to_csv(str(out_dir / 'db.csv'), index_label='NR.CRT', encoding='utf-8',
+                                                   float_format=FLOAT_FORMAT)
+
+
+def update_csv(batch, out_dir):
+    """
+    Replaces the rows of the pdfs of the batch in db.csv, ocr_fields.csv and plates.json, the rows of the other pdfs
+    are kept the way they were written.
+    """
+    frame = batch.to_frame()
+    pdfs = set(frame["POLITA PDF"])
+    fields = read_fields(out_dir)
+    fields = pd.concat([fields[~fields["POLITA PDF"].isin(pdfs)], fields_frame(frame)], ignore_index=True)
+    fields.to_csv(str(out_dir / OCR_FIELDS_FILE), index=False, encoding='utf-8')
+    df = normalize(frame)
+    index = PlateIndex.load(out_dir)
+    index.replace(pdfs, PlateIndex.from_frame(df))
+    index.save(out_dir)
+    # the new rows go through the same csv formatting as the kept ones
+    new = pd.read_csv(io.StringIO(to_db_frame(df).to_csv(index=False, float_format=FLOAT_FORMAT)), dtype=str,
+                      keep_default_na=False)
+    db = read_db(out_dir)
+    # db.csv may have been written with a selection of the columns
+    db = pd.concat([db[~db["POLITA PDF"].isin(pdfs)], new[db.columns]], ignore_index=True)
+    db = db.sort_values(by=['NUME CLIENT'], key=lambda names: names.replace('', np.nan), ignore_index=True)
+    db.to_csv(str(out_dir / 'db.csv'), index_label='NR.CRT', encoding='utf-8')
+
+
+def read_db(out_dir) -> pd.DataFrame:
+    """db.csv as written, every value a string and the missing ones empty."""
+    return pd.read_csv(str(out_dir / 'db.csv'), index_col='NR.CRT', dtype=str, keep_default_na=False, encoding='utf-8')
 
-def to_csv(data, out_dir):
-    df = pd.DataFrame(data, columns=['ASIGURATOR', "NUMAR POLITA", "CLASA B/M", "DATA EMITERE", "DATA EXPIRARE",
-                                     "NUME CLIENT", "NUMAR DE TELEFON", "TIP ASIGURARE", "NUMAR INMATRICULARE",
-                                     "PERIODA DE ASIGURARE", "VALOARE POLITA", "POLITA PDF"])
-    df["DATA EMITERE"] = df["DATA EMITERE"].astype("M8")
-    df["DATA EXPIRARE"] = df["DATA EXPIRARE"].astype("M8")
+
+def fields_frame(frame: pd.DataFrame) -> pd.DataFrame:
+    """One row per ocr field of the rows of the frame, from the json of the fields column."""
+    rows = [[pdf, field, text, confidence]
+            for pdf, reads in zip(frame["POLITA PDF"], frame[FIELDS_COLUMN]) if reads is not None
+            for field, (text, confidence) in json.loads(reads).items()]
+    return pd.DataFrame(rows, columns=OCR_FIELDS_COLUMNS)
+
+
+def read_fields(out_dir) -> pd.DataFrame:
+    path = out_dir / OCR_FIELDS_FILE
+    if not path.exists():
+        return pd.DataFrame([], columns=OCR_FIELDS_COLUMNS)
+    return pd.read_csv(str(path), dtype={"TEXT": str}, keep_default_na=False, encoding='utf-8')
+
+
+def to_db_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """The normalized frame the way db.csv shows it."""
     df["DATA EMITERE"] = df["DATA EMITERE"].dt.strftime("%d.%m.%y")
     df["DATA EXPIRARE"] = df["DATA EXPIRARE"].dt.strftime("%d.%m.%y")
-    df = df.sort_values(by=['NUME CLIENT'], ignore_index=True)
-    df.to_csv(str(out_dir / 'db.csv'), index_label='NR.CRT', encoding='utf-8')
\ No newline at end of file
+    if df["VALOARE POLITA"].dtype == object:
+        # amounts that did not parse keep their text, float_format skips a column of objects
+        df["VALOARE POLITA"] = df["VALOARE POLITA"].map(
+            lambda v: FLOAT_FORMAT % v if isinstance(v, float) and not np.isnan(v) else v)
+    return df.sort_values(by=['NUME CLIENT'], ignore_index=True)
+
+
+def duplicates_to_csv(duplicates, out_dir):
+    rows = [["COPIE", str(path), str(copy), 0] for path, copies in duplicates.copies.items() for copy in copies]
+    rows += [["POSIBIL DUPLICAT", str(path_a), str(path_b), distance] for path_a, path_b, distance in duplicates.near]
+    df = pd.DataFrame(rows, columns=["TIP", "POLITA PDF", "DUPLICAT PDF", "DISTANTA"])
+    df.to_csv(str(out_dir / 'duplicates.csv'), index=False, encoding='utf-8')
@@ -0,0 +1,96 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ['ASIGURATOR', "NUMAR POLITA", "CLASA B/M", "DATA EMITERE", "DATA EXPIRARE", "NUME CLIENT",
+           "NUMAR DE TELEFON", "TIP ASIGURARE", "NUMAR INMATRICULARE", "PERIODA DE ASIGURARE", "VALOARE POLITA",
+           "POLITA PDF"]
+# only used to compute PERIODA DE ASIGURARE, not exported
+START_DATE_COLUMN = "DATA INCEPUT"
+# json of the raw text and ocr confidence of each field, by field name, exported to ocr_fields.csv instead of db.csv
+FIELDS_COLUMN = "CAMPURI OCR"
+ROW_COLUMNS = COLUMNS + [START_DATE_COLUMN, FIELDS_COLUMN]
+
+DATE_COLUMNS = ["DATA EMITERE", "DATA EXPIRARE", START_DATE_COLUMN]
+
+# db.csv column of each field of options.FIELDS, start_date is only used for PERIODA DE ASIGURARE
+COLUMNS_BY_FIELD = {'insurer': "ASIGURATOR", 'insurance_number': "NUMAR POLITA", 'insurance_class': "CLASA B/M",
+                    'contract_date': "DATA EMITERE", 'expiration_date': "DATA EXPIRARE", 'person_name': "NUME CLIENT",
+                    'type': "TIP ASIGURARE", 'car_number': "NUMAR INMATRICULARE",
+                    'insurance_months': "PERIODA DE ASIGURARE", 'amount': "VALOARE POLITA"}
+
+
+def export_columns(fields=None):
+    """db.csv columns of the selected fields and POLITA PDF, all the columns when fields is None."""
+    if fields is None:
+        return COLUMNS
+    selected = {COLUMNS_BY_FIELD[f] for f in fields if f in COLUMNS_BY_FIELD}
+    return [c for c in COLUMNS if c in selected or c == "POLITA PDF"]
+
+
+def normalize(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Normalizes the whole result set at once with pandas column operations, instead of per row python code in the
+    workers: dates, the insurance interval in months, amounts and car numbers.
+    """
+    for column in DATE_COLUMNS:
+        df[column] = pd.to_datetime(df[column], errors='coerce')
+    df["PERIODA DE ASIGURARE"] = diff_months(df["DATA EXPIRARE"], df[START_DATE_COLUMN])
+    df["VALOARE POLITA"] = amounts_or_text(df["VALOARE POLITA"], df["POLITA PDF"])
+    df["NUMAR INMATRICULARE"] = normalize_car_numbers(df["NUMAR INMATRICULARE"])
+    return df.drop(columns=[START_DATE_COLUMN, FIELDS_COLUMN])
+
+
+def diff_months(end: pd.Series, start: pd.Series) -> pd.Series:
+    months = (end.dt.year - start.dt.year) * 12 + (end.dt.month - start.dt.month)
+    return months.astype("Int64")
+
+
+def on_uniques(func):
+    """
+    pandas string methods still loop in python, so run them once per distinct value (amounts and insurers repeat a
+    lot across an archive) and broadcast the result back with the factorize codes.
+    """
+
+    def wrapper(values: pd.Series) -> pd.Series:
+        codes, uniques = pd.factorize(values)
+        result = func(pd.Series(uniques, dtype="string")).to_numpy()
+        result = np.append(result, pd.NA if result.dtype == object else np.nan)
+        # code -1 (missing) picks the NA appended at the end
+        return pd.Series(result[codes], index=values.index).astype(result.dtype)
+
+    return wrapper
+
+
+def amounts_or_text(amounts: pd.Series, pdfs: pd.Series) -> pd.Series:
+    """The parsed amounts, an amount that does not parse keeps its extracted text and is logged with its pdf."""
+    parsed = parse_amounts(amounts)
+    unparsed = parsed.isna() & amounts.notna() & (amounts.astype(str).str.strip() != '')
+    for pdf, amount in zip(pdfs[unparsed], amounts[unparsed]):
+        logger.warning("Could not parse the amount %r of %s, it is exported as extracted.", amount, pdf)
+    return parsed.where(~unparsed, amounts) if unparsed.any() else parsed
+
+
+@on_uniques
+def parse_amounts(amounts: pd.Series) -> pd.Series:
+    """
+    '1.234,56 Lei', '1234,56', '1,234.56', '1.234.567,89', ': 1.234,56 lei.' -> the number, NaN when it does not
+    parse. A dot or comma followed by exactly three digits and then another separator or the end is a thousands
+    separator, every one of them is removed, the remaining comma is the decimal separator. A lone ',ddd' is read as
+    thousands, '1,234' -> 1234: the premiums have two decimals, never three.
+    """
+    # the punctuation of the text around the amount, ': 1.234,56 lei.'
+    txt = amounts.str.replace(r'[^\d,.]', '', regex=True).str.strip('.,')
+    txt = txt.str.replace(r',(?=\d{3}(?:[,.]|$))', '', regex=True)
+    txt = txt.str.replace(r'\.(?=\d{3}(?:[,.]|$))', '', regex=True)
+    txt = txt.str.replace(',', '.', regex=False)
+    return pd.to_numeric(txt, errors='coerce').round(2)
+
+
+@on_uniques
+def normalize_car_numbers(car_numbers: pd.Series) -> pd.Series:
+    # vectorized plates.plate_key
+    return car_numbers.str.upper().str.replace(r'[^A-Z0-9]', '', regex=True)
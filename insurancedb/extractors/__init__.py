@@ -1,2 +0,0 @@
-import insurancedb.extractors.ocr
-import insurancedb.extractors.simple
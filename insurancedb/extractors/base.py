@@ -1,11 +1,88 @@
 import abc
+from typing import Dict, Tuple
+
+# Rough relative cost of an extraction stage, used to run the cheapest checks of all candidate extractors first.
+COST_NONE = 0
+# file name and page count checks
+COST_FILE = 1
+# pdf text layer of a page
+COST_TEXT = 5
+# low resolution render with a template match or a small ocr
+COST_THUMBNAIL = 50
+# full resolution render with ocr of a few header fields
+COST_OCR = 500
+# ocr of all the remaining fields
+COST_OCR_FIELDS = 2000
+
+# getter of each field, by the names of options.FIELDS
+FIELD_GETTERS = {
+    'insurer': 'get_insurer_short_name',
+    'insurance_number': 'get_insurance_number',
+    'insurance_class': 'get_insurance_class',
+    'contract_date': 'get_contract_date',
+    'start_date': 'get_start_date',
+    'expiration_date': 'get_expiration_date',
+    'person_name': 'get_person_name',
+    'type': 'get_type',
+    'car_number': 'get_car_number',
+    'amount': 'get_insurance_amount',
+}
 
 
 class BaseRcaExtractor(abc.ABC):
+    """
+    Extraction runs in three stages, each with a cost estimate:
 
-    def is_match(self):
+    probe   -- cheap reject, False when the document is certainly not handled by this extractor
+    confirm -- True when the document is handled by this extractor
+    extract -- reads the fields, called once after a successful confirm, before the getters
+    """
+    probe_cost = COST_NONE
+    confirm_cost = COST_TEXT
+    extract_cost = COST_NONE
+
+    def probe(self):
+        return True
+
+    def confirm(self):
+        return False
+
+    def extract(self):
         pass
 
+    @property
+    def spec(self):
+        """The ExtractorSpec of this extractor, the one place of its file name hints and pages."""
+        # the registry imports this module
+        from insurancedb.extractors.registry import spec_of
+        return spec_of(type(self))
+
+    def _is_file_name_matching(self):
+        return self.spec.matches_file_name(self.file_name)
+
+    def get_confirmed_page(self) -> int:
+        """Page of the pdf a successful confirm matched on, the first page of the spec when it reads only that one."""
+        return self.spec.pages[0]
+
+    def get_field(self, field: str):
+        return getattr(self, FIELD_GETTERS[field])()
+
+    def get_field_reads(self) -> Dict[str, Tuple[str, float]]:
+        """Raw text and ocr confidence of the fields read by extract, by field name, empty without ocr."""
+        return {}
+
+    def keep_field_reads(self, reads: Dict[str, Tuple[str, float]]):
+        """Called after confirm, extract then takes these fields from reads instead of reading them again."""
+        pass
+
+    def is_match(self):
+        """Runs all the stages, for callers that use a single extractor."""
+        if getattr(self, '_matched', None) is None:
+            self._matched = self.probe() and self.confirm()
+            if self._matched:
+                self.extract()
+        return self._matched
+
     def get_insurer_short_name(self):
         pass
 
@@ -38,5 +115,3 @@ class BaseRcaExtractor(abc.ABC):
 
     def get_type(self):
         return "RCA"
-
-
@@ -0,0 +1,68 @@
+from typing import Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pdfplumber
+
+from insurancedb.extractors.page_buffer import Box
+
+# darker than this on a gray thumbnail is ink
+INK_THRESHOLD = 160
+# rows and columns with fewer ink pixels are scanner noise
+MIN_INK_PIXELS = 3
+# largest shift, at BASE_RESOLUTION, and scale change taken for a misaligned scan of the layout, anything larger is a
+# different page
+MAX_SHIFT = 300
+MAX_SCALE_CHANGE = 0.05
+
+
+class Transform(NamedTuple):
+    """Maps a box of a reference page to the same content on a shifted or scaled scan, at BASE_RESOLUTION."""
+    dx: float = 0.0
+    dy: float = 0.0
+    scale: float = 1.0
+
+    def apply(self, box: Box) -> Box:
+        x0, y0, x1, y1 = box
+        return tuple(int(round(v)) for v in (x0 * self.scale + self.dx, y0 * self.scale + self.dy,
+                                             x1 * self.scale + self.dx, y1 * self.scale + self.dy))
+
+
+IDENTITY = Transform()
+
+# content box of the first page of each layout key that was read with uncalibrated boxes, per process
+_references: Dict[Tuple, Box] = {}
+
+
+def layout_key(layout: str, pdf: pdfplumber.PDF, page: int) -> Tuple:
+    """Pages of the same layout, made by the same producer (scanner software), at the same page size."""
+    pdf_page = pdf.pages[page]
+    return layout, pdf.metadata.get('Producer'), round(float(pdf_page.width)), round(float(pdf_page.height))
+
+
+def get_reference(key: Tuple) -> Optional[Box]:
+    return _references.get(key)
+
+
+def set_reference(key: Tuple, box: Box):
+    _references.setdefault(key, box)
+
+
+def content_box(gray: np.ndarray, factor: float) -> Optional[Box]:
+    """Box around the ink of a gray page image rendered at factor * BASE_RESOLUTION, at BASE_RESOLUTION."""
+    ink = gray < INK_THRESHOLD
+    rows = np.flatnonzero(np.count_nonzero(ink, axis=1) >= MIN_INK_PIXELS)
+    cols = np.flatnonzero(np.count_nonzero(ink, axis=0) >= MIN_INK_PIXELS)
+    if len(rows) == 0 or len(cols) == 0:
+        return None
+    return tuple(int(round(v / factor)) for v in (cols[0], rows[0], cols[-1] + 1, rows[-1] + 1))
+
+
+def estimate_transform(reference: Box, actual: Box) -> Optional[Transform]:
+    """Transform from the reference content box to the actual one, None when it is too large to be a misalignment."""
+    scale = ((actual[2] - actual[0]) / max(reference[2] - reference[0], 1) +
+             (actual[3] - actual[1]) / max(reference[3] - reference[1], 1)) / 2
+    dx = actual[0] - reference[0] * scale
+    dy = actual[1] - reference[1] * scale
+    if abs(scale - 1) > MAX_SCALE_CHANGE or abs(dx) > MAX_SHIFT or abs(dy) > MAX_SHIFT:
+        return None
+    return Transform(dx, dy, scale)
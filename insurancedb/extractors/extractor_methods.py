@@ -1,5 +1,7 @@
 import datetime
+import functools
 import re
+from typing import Optional
 
 import PIL
 import cv2
@@ -9,6 +11,9 @@ import pdfplumber
 import pytesseract
 from PIL import Image
 
+from insurancedb.extractors.options import TEMPLATE_MATCH_METHODS
+from insurancedb.extractors.page_buffer import PageBuffer
+from insurancedb.extractors.plates import find_car_number
 from insurancedb.utils import get_project_root
 
 resources_dir = get_project_root() / "resources"
@@ -49,28 +54,23 @@ def diff_months(end: datetime.date, start: datetime.date):
 
 
 def get_car_number(text: str):
-    match = re.search(
-        r'((AB|AG|AR|BC|BH|BN|BR|BT|BV|BZ|CJ|CL|CS|CT|CV|DB|DJ|GJ|GL|GR|HD|HR|IF|IL|IS|MH|MM|MS|NT|OT|PH|SB|SJ|SM|SV|TL|TM|TR|VL|VN|VS)\s*[0-9]{2}\s*[A-Z]{3}|B\s*[0-9]{2,3}\s*[A-Z]{3})',
-        text)
-    if match:
-        return remove_white_spaces(clean_text(match.group(1)))
-    else:
-        return None
+    return find_car_number(text)
+
+
+RO_CAR_NUMBER_OCR_CONFIG = r'-l eng --psm 7 --user-patterns ' + str(resources_dir / "ro-car-number-tess.patterns")
+DIGITS_OCR_CONFIG = r'-l eng --psm 7 -c tessedit_char_whitelist=0123456789'
 
 
 def get_ro_car_number_from_image(car_number_image_l):
-    ro_car_number_tess_patterns_path = resources_dir / "ro-car-number-tess.patterns"
     car_number_image_l = add_margin(car_number_image_l, 10, 10, 10, 10, (255, 255, 255))
-    return get_image_text_using_ocr(car_number_image_l,
-                                    ocr_config=r'-l eng --psm 7 --user-patterns ' + str(
-                                        ro_car_number_tess_patterns_path))
+    return get_image_text_using_ocr(car_number_image_l, ocr_config=RO_CAR_NUMBER_OCR_CONFIG)
 
 
 def get_pdf_page_text(pdf: pdfplumber.PDF, page: int):
     text = ""
     if len(pdf.pages) >= page + 1:
         pdf_page = pdf.pages[page]
-        text = pdf_page.extract_text()
+        text = pdf_page.extract_text() or ""
     return text
 
 
@@ -92,18 +92,46 @@ def get_image_text_using_ocr(image, ocr_config=r'-l ron --psm 7'):
     return pytesseract.image_to_string(image, config=ocr_config)
 
 
-def get_image_digits_using_ocr(image, ocr_config=r'-l eng --psm 7 -c tessedit_char_whitelist=0123456789'):
+def get_image_digits_using_ocr(image, ocr_config=DIGITS_OCR_CONFIG):
     return pytesseract.image_to_string(image, config=ocr_config)
 
 
+def get_image_text_and_confidence_using_ocr(image, ocr_config=r'-l ron --psm 7'):
+    """
+    Text and mean word confidence (0-100) from tesseract's image_to_data. Words are joined with a single space and
+    lines with a new line, the same shape image_to_string gives to the extractor regexes.
+    """
+    data = pytesseract.image_to_data(image, config=ocr_config, output_type=pytesseract.Output.DICT)
+    lines = {}
+    confidences = []
+    for i, word in enumerate(data["text"]):
+        conf = float(data["conf"][i])
+        if conf < 0 or not word.strip():
+            continue
+        confidences.append(conf)
+        lines.setdefault((data["block_num"][i], data["par_num"][i], data["line_num"][i]), []).append(word)
+    text = "\n".join(" ".join(words) for words in lines.values())
+    confidence = sum(confidences) / len(confidences) if confidences else 0.0
+    return text, confidence
+
+
 def get_pdf_page_image(pdf: pdfplumber.PDF, page: int, resolution=600):
     img = None
     if len(pdf.pages) >= page + 1:
         pdf_page = pdf.pages[page]
-        img = pdf_page.to_image(resolution=resolution).original.convert('RGB')
+        img = pdf_page.to_image(resolution=resolution).original
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
     return img
 
 
+def get_pdf_page_buffer(pdf: pdfplumber.PDF, page: int, resolution=600):
+    img = get_pdf_page_image(pdf, page, resolution)
+    if img is None:
+        return None
+    return PageBuffer.from_pil(img, resolution)
+
+
 def contains_unparsable_characters(text: str):
     return re.search('\(cid:[0-9]{2,3}\)', text) is not None
 
@@ -121,6 +149,8 @@ def add_margin(pil_img, top, right, bottom, left, color):
     source https://github.com/nkmk/python-snippets/blob/0f6b4672097e91b00e51775ae1932aaf47b8977a/notebook/my_lib/imagelib.py#L4-L10
 
     """
+    if isinstance(pil_img, np.ndarray):
+        return cv2.copyMakeBorder(pil_img, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
     width, height = pil_img.size
     new_width = width + right + left
     new_height = height + top + bottom
@@ -130,14 +160,14 @@ def add_margin(pil_img, top, right, bottom, left, color):
 
 
 def find_position_of_template(input_img: np.ndarray, template: np.ndarray, threshold=0.8, input_mask=None,
-                              use_inverted_template_as_mask=True):
+                              use_inverted_template_as_mask=True, methods=TEMPLATE_MATCH_METHODS):
     """
 
     source https://docs.opencv.org/4.5.2/d4/dc6/tutorial_py_template_matching.html
 
     """
-    gray_img = cv2.cvtColor(input_img, cv2.COLOR_BGR2GRAY)
-    gray_template = cv2.cvtColor(template, cv2.COLOR_BGR2GRAY)
+    gray_img = to_gray(input_img)
+    gray_template = to_gray(template)
     mask = None
     if input_mask is not None:
         mask = input_mask
@@ -145,15 +175,13 @@ def find_position_of_template(input_img: np.ndarray, template: np.ndarray, thres
         mask = cv2.bitwise_not(gray_template)
 
     w, h = gray_template.shape[::-1]
-    # Try all 6 methods
-    methods = ['cv2.TM_CCOEFF_NORMED', 'cv2.TM_CCORR_NORMED', 'cv2.TM_SQDIFF_NORMED']
 
     def detect_positions():
-        for meth in methods:
-            img = gray_img.copy()
-            method = eval(meth)
-            # Apply template Matching
-            res = cv2.matchTemplate(img, gray_template, method, mask=mask)
+        for name in methods:
+            method = getattr(cv2, name)
+            meth = 'cv2.' + name
+            # Apply template Matching, matchTemplate does not write to its inputs so the page is not copied
+            res = cv2.matchTemplate(gray_img, gray_template, method, mask=mask)
             min_val, max_val, min_loc, max_loc = cv2.minMaxLoc(res)
             if method in [cv2.TM_SQDIFF_NORMED]:
                 top_left = min_loc
@@ -178,9 +206,33 @@ def get_top_left_position_of_template(input_img: np.ndarray, template: np.ndarra
 
 
 def to_opencv(pil_image: PIL.Image) -> np.ndarray:
-    open_cv_image = np.array(pil_image)
-    cv2.cvtColor(open_cv_image, cv2.COLOR_BGR2RGB)
-    return open_cv_image
+    if isinstance(pil_image, PageBuffer):
+        return pil_image.array
+    return np.asarray(pil_image)
+
+
+def binarize(img: np.ndarray) -> np.ndarray:
+    """Black text on white with an otsu threshold."""
+    _, binary = cv2.threshold(to_gray(img), 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return binary
+
+
+def with_oem(ocr_config: str, oem: Optional[int]) -> str:
+    return ocr_config if oem is None else f'{ocr_config} --oem {oem}'
+
+
+def to_gray(img: np.ndarray) -> np.ndarray:
+    if isinstance(img, PageBuffer):
+        return img.gray()
+    if img.ndim == 2:
+        return img
+    return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+
+@functools.lru_cache(maxsize=None)
+def load_template(name: str) -> np.ndarray:
+    """Grayscale template from the resources dir, read once per process."""
+    return cv2.imread(str(resources_dir / name), cv2.IMREAD_GRAYSCALE)
 
 
 def show_image_with_bboxes(img: np.ndarray, bboxes: pd.DataFrame):
@@ -2,29 +2,28 @@ import logging
 import re
 from dataclasses import dataclass
 
-import cv2 as cv
 import numpy as np
 import pdfplumber
 
-from insurancedb.extractors.base import BaseRcaExtractor
-from insurancedb.extractors.extractor_methods import get_pdf_page_image, get_image_text_using_ocr, \
-    get_image_digits_using_ocr, \
-    get_ro_car_number_from_image, remove_slashes, is_RCA, clean_text, get_date, get_car_number, \
-    find_position_of_template, to_opencv
-from insurancedb.extractors.registry import extractor_register
-from insurancedb.utils import get_project_root
-
-resources_dir = get_project_root() / "resources"
+from insurancedb.extractors.base import BaseRcaExtractor, COST_TEXT, COST_THUMBNAIL, COST_OCR, COST_OCR_FIELDS
+from insurancedb.extractors.extractor_methods import remove_slashes, is_RCA, clean_text, get_date, get_car_number
+from insurancedb.extractors.options import ExtractionOptions
+from insurancedb.extractors.page_reader import PageReader
 
 
 @dataclass
-@extractor_register
 class AxeriaRcaExtractor(BaseRcaExtractor):
     file_name: str
     pdf: pdfplumber.PDF = None
+    options: ExtractionOptions = None
+
+    probe_cost = COST_TEXT
+    confirm_cost = COST_OCR
+    extract_cost = COST_OCR_FIELDS
 
     def __post_init__(self):
         self.logger = logging.getLogger(f'{__name__}.{self.__class__.__name__}')
+        self.options = self.options if self.options is not None else ExtractionOptions()
         empty = ""
         self.contract_name_l = empty
         self.insurer_name_l = empty
@@ -33,47 +32,62 @@ class AxeriaRcaExtractor(BaseRcaExtractor):
         self.start_end_l = empty
         self.person_name_l = empty
         self.car_number_l = empty
-        self.is_matching = self._is_file_name_matching()
-
-        pages = [2]
-
-        if self.is_matching:
-            for page in pages:
-                page_img = get_pdf_page_image(self.pdf, page)
-                if page_img is not None:
-                    self.contract_name_l = get_image_text_using_ocr(page_img.crop((140, 3631, 2931, 3730)))
-                    self.insurer_name_l = get_image_text_using_ocr(page_img.crop((140, 3917, 2011, 4005)))
-                    self.is_matching = self._is_page_matching()
-                    if self.is_matching:
-                        self._continue_extracting(page_img)
-                        self._log_extracted_values()
-                        break
-
-    def _continue_extracting(self, page_img):
-        self.insurance_number_l = get_image_digits_using_ocr(page_img.crop((1598, 1111, 2761, 1325)))
-        self.start_end_l = get_image_text_using_ocr(page_img.crop((130, 5682, 4814, 5810)))
-        self.amount_class_l = get_image_text_using_ocr(page_img.crop((130, 5808, 4814, 5930)))
-        self.person_name_l = get_image_text_using_ocr(page_img.crop((1064, 4397, 2685, 4547)))
-        self.car_number_l = get_ro_car_number_from_image(page_img.crop((183, 1478, 1572, 1635)))
+        self.readers = []
+        self.reader = None
+
+    def probe(self):
+        if not self._is_file_name_matching():
+            return False
+        readers = [PageReader(self.pdf, page, self.options) for page in self.spec.pages]
+        self.readers = [reader for reader in readers
+                        if reader.exists() and not reader.text_layer_lacks(self.get_insurer_short_name())]
+        return len(self.readers) > 0
+
+    def confirm(self):
+        for reader in self.readers:
+            if reader.confirm_calibrated(self.get_insurer_short_name(), self._read_header):
+                self.reader = reader
+                return True
+        return False
+
+    def get_confirmed_page(self) -> int:
+        return self.reader.page
+
+    def _read_header(self, reader: PageReader):
+        self.contract_name_l = reader.text((140, 3631, 2931, 3730))
+        self.insurer_name_l = reader.text((140, 3917, 2011, 4005))
+        return self._is_page_matching()
+
+    def extract(self):
+        self._continue_extracting(self.reader)
+        self._log_extracted_values()
+
+    def get_field_reads(self):
+        return self.reader.fields if self.reader is not None else {}
+
+    def keep_field_reads(self, reads):
+        self.reader.known_fields = reads
+
+    def _continue_extracting(self, reader: PageReader):
+        self.insurance_number_l = reader.digits((1598, 1111, 2761, 1325), field='insurance_number_l')
+        self.start_end_l = reader.text((130, 5682, 4814, 5810), field='start_end_l')
+        self.amount_class_l = reader.text((130, 5808, 4814, 5930), field='amount_class_l')
+        self.person_name_l = reader.text((1064, 4397, 2685, 4547), field='person_name_l')
+        self.car_number_l = reader.car_number((183, 1478, 1572, 1635), field='car_number_l')
         self.insurance_number_l = remove_slashes(self.insurance_number_l)
 
     def _log_extracted_values(self):
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
         self.logger.debug(
             "contract_name_p: %s, insurer_name_p: %s, insurance_number_p: %s, start_end_p: %s, amount_class_p: %s, person_name_p: %s, car_number_p: %s",
             self.contract_name_l, self.insurer_name_l, self.insurance_number_l, self.start_end_l, self.amount_class_l,
             self.person_name_l, self.car_number_l)
 
-    def is_match(self):
-        return self.is_matching
-
     def _is_page_matching(self):
         is_rca = is_RCA(self.contract_name_l)
         return is_rca and self.get_insurer_name() == "AXERIA IARD"
 
-    def _is_file_name_matching(self):
-        return re.search(self.get_insurer_short_name(), self.file_name, re.IGNORECASE) is not None or \
-               re.search("RO31N31JT", self.file_name, re.IGNORECASE) is not None
-
     def get_insurer_short_name(self):
         return "AXERIA"
 
@@ -125,13 +139,18 @@ class AxeriaRcaExtractor(BaseRcaExtractor):
 
 
 @dataclass
-@extractor_register
 class AllianzRcaExtractor(BaseRcaExtractor):
     file_name: str
     pdf: pdfplumber.PDF = None
+    options: ExtractionOptions = None
+
+    probe_cost = COST_THUMBNAIL
+    confirm_cost = COST_OCR
+    extract_cost = COST_OCR_FIELDS
 
     def __post_init__(self):
         self.logger = logging.getLogger(f'{__name__}.{self.__class__.__name__}')
+        self.options = self.options if self.options is not None else ExtractionOptions()
         self.anchors = {"page-top-left": (0, 0)}
 
         empty = ""
@@ -142,27 +161,56 @@ class AllianzRcaExtractor(BaseRcaExtractor):
         self.start_end_l = empty
         self.person_name_l = empty
         self.car_number_l = empty
-        self.is_matching = self._is_file_name_matching()
-
-        pages = [0, 2]
-        if self.is_matching:
-            for page in pages:
-                page_img = get_pdf_page_image(self.pdf, page)
-                if page_img is not None:
-                    insurer_nm_bbox = find_position_of_template(to_opencv(page_img), cv.imread(
-                        str(resources_dir / "insurer_nm_allianz.png")))
-                    if not insurer_nm_bbox.empty:
-                        self.anchors["insurer-nm-allianz"] = (insurer_nm_bbox.iloc[0][0], insurer_nm_bbox.iloc[0][1])
-                        crop_points_dict = self._get_crop_points_dict()
-                        self.contract_name_l = get_image_text_using_ocr(
-                            page_img.crop(crop_points_dict["contract_name_l"]))  #
-                        self.insurer_name_l = get_image_text_using_ocr(
-                            page_img.crop(crop_points_dict["insurer_name_l"]))
-                        self.is_matching = self._is_page_matching()
-                        if self.is_matching:
-                            self._continue_extracting(page_img, crop_points_dict)
-                            self._log_extracted_values()
-                            break
+        self.candidates = []
+        self.reader = None
+        self.crop_points_dict = None
+
+    def probe(self):
+        """Template match on a thumbnail of each candidate page, confirm only searches around these matches."""
+        if not self._is_file_name_matching():
+            return False
+        self.candidates = []
+        for page in self.spec.pages:
+            reader = PageReader(self.pdf, page, self.options)
+            if reader.exists() and not reader.text_layer_lacks(self.get_insurer_short_name()):
+                text_bbox = reader.find_text_layer_word("Denumire") if self.options.text_layer else None
+                if text_bbox is not None:
+                    # the template starts with this word, no need to render the page to find it
+                    self.candidates.append((reader, text_bbox, True))
+                    continue
+                probe_bbox = reader.find_template("insurer_nm_allianz.png", threshold=self.options.probe_threshold,
+                                                  resolution=self.options.probe_resolution)
+                if probe_bbox is not None:
+                    self.candidates.append((reader, probe_bbox, False))
+        return len(self.candidates) > 0
+
+    def confirm(self):
+        for reader, probe_bbox, is_exact in self.candidates:
+            insurer_nm_bbox = probe_bbox if is_exact else reader.find_template("insurer_nm_allianz.png",
+                                                                                near=probe_bbox)
+            if insurer_nm_bbox is not None:
+                self.anchors["insurer-nm-allianz"] = (insurer_nm_bbox[0], insurer_nm_bbox[1])
+                crop_points_dict = self._get_crop_points_dict()
+                self.contract_name_l = reader.text(crop_points_dict["contract_name_l"])
+                self.insurer_name_l = reader.text(crop_points_dict["insurer_name_l"])
+                if self._is_page_matching():
+                    self.reader = reader
+                    self.crop_points_dict = crop_points_dict
+                    return True
+        return False
+
+    def get_confirmed_page(self) -> int:
+        return self.reader.page
+
+    def extract(self):
+        self._continue_extracting(self.reader, self.crop_points_dict)
+        self._log_extracted_values()
+
+    def get_field_reads(self):
+        return self.reader.fields if self.reader is not None else {}
+
+    def keep_field_reads(self, reads):
+        self.reader.known_fields = reads
 
     def _get_crop_points_dict(self):
         relative_crop_points = np.array([[-4, -100, 2712, 10],  # contract_name_l / insurer-nm-allianz
@@ -190,27 +238,22 @@ class AllianzRcaExtractor(BaseRcaExtractor):
 
         return result
 
-    def _continue_extracting(self, page_img, crop_points_dict):
-        self.insurance_number_l = get_image_digits_using_ocr(page_img.crop(crop_points_dict["insurance_number_l"]))
-        self.amount_class_l = get_image_text_using_ocr(page_img.crop(crop_points_dict["amount_class_l"]))  #
-        self.start_end_l = get_image_text_using_ocr(page_img.crop(crop_points_dict["start_end_l"]))  #
-        self.person_name_l = get_image_text_using_ocr(page_img.crop(crop_points_dict["person_name_l"]))  #
-        self.car_number_l = get_ro_car_number_from_image(page_img.crop(crop_points_dict["car_number_l"]))
+    def _continue_extracting(self, reader: PageReader, crop_points_dict):
+        self.insurance_number_l = reader.digits(crop_points_dict["insurance_number_l"], field='insurance_number_l')
+        self.amount_class_l = reader.text(crop_points_dict["amount_class_l"], field='amount_class_l')
+        self.start_end_l = reader.text(crop_points_dict["start_end_l"], field='start_end_l')
+        self.person_name_l = reader.text(crop_points_dict["person_name_l"], field='person_name_l')
+        self.car_number_l = reader.car_number(crop_points_dict["car_number_l"], field='car_number_l')
         self.insurance_number_l = remove_slashes(self.insurance_number_l)
 
     def _log_extracted_values(self):
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
         self.logger.debug(
             "contract_name_p: %s, insurer_name_p: %s, insurance_number_p: %s, start_end_p: %s, amount_class_p: %s, person_name_p: %s, car_number_p: %s",
             self.contract_name_l, self.insurer_name_l, self.insurance_number_l, self.start_end_l, self.amount_class_l,
             self.person_name_l, self.car_number_l)
 
-    def is_match(self):
-        return self.is_matching
-
-    def _is_file_name_matching(self):
-        return re.search(self.get_insurer_short_name(), self.file_name, re.IGNORECASE) is not None \
-               or re.search("RO07R7YD", self.file_name, re.IGNORECASE) is not None
-
     def _is_page_matching(self):
         is_rca = is_RCA(self.contract_name_l)
         return is_rca and self.get_insurer_name() == "ALLIANZ - ŢIRIAC ASIGURĂRI"
@@ -266,13 +309,18 @@ class AllianzRcaExtractor(BaseRcaExtractor):
 
 
 @dataclass
-@extractor_register
 class GroupamaRcaExtractor(BaseRcaExtractor):
     file_name: str
     pdf: pdfplumber.PDF = None
+    options: ExtractionOptions = None
+
+    probe_cost = COST_TEXT
+    confirm_cost = COST_OCR
+    extract_cost = COST_OCR_FIELDS
 
     def __post_init__(self):
         self.logger = logging.getLogger(f'{__name__}.{self.__class__.__name__}')
+        self.options = self.options if self.options is not None else ExtractionOptions()
         empty = ""
         self.contract_name_l = empty
         self.insurer_name_l = empty
@@ -281,42 +329,58 @@ class GroupamaRcaExtractor(BaseRcaExtractor):
         self.start_end_l = empty
         self.person_name_l = empty
         self.car_number_l = empty
-        self.is_matching = self._is_file_name_matching()
-
-        pages = [0]
-        if self.is_matching:
-            for page in pages:
-                page_img = get_pdf_page_image(self.pdf, page)
-                if page_img is not None:
-                    self.contract_name_l = get_image_text_using_ocr(page_img.crop((193, 3507, 2182, 3607)))
-                    self.insurer_name_l = get_image_text_using_ocr(page_img.crop((193, 3609, 1450, 3702)))
-                    self.is_matching = self._is_page_matching()
-                    if self.is_matching:
-                        self._continue_extracting(page_img)
-                        self._log_extracted_values()
-                        break
-
-    def _continue_extracting(self, page_img):
-        self.insurance_number_l = get_image_digits_using_ocr(page_img.crop((1476, 996, 2544, 1122)))
-        self.start_end_l = get_image_text_using_ocr(page_img.crop((193, 5115, 4788, 5223)))
-        self.amount_class_l = get_image_text_using_ocr(page_img.crop((193, 5211, 4788, 5313)))
-        self.person_name_l = get_image_text_using_ocr(page_img.crop((954, 3945, 2728, 4114)))
-        self.car_number_l = get_ro_car_number_from_image(page_img.crop((193, 1306, 1454, 1373)))
+        self.readers = []
+        self.reader = None
+
+    def probe(self):
+        if not self._is_file_name_matching():
+            return False
+        readers = [PageReader(self.pdf, page, self.options) for page in self.spec.pages]
+        self.readers = [reader for reader in readers
+                        if reader.exists() and not reader.text_layer_lacks(self.get_insurer_short_name())]
+        return len(self.readers) > 0
+
+    def confirm(self):
+        for reader in self.readers:
+            if reader.confirm_calibrated(self.get_insurer_short_name(), self._read_header):
+                self.reader = reader
+                return True
+        return False
+
+    def get_confirmed_page(self) -> int:
+        return self.reader.page
+
+    def _read_header(self, reader: PageReader):
+        self.contract_name_l = reader.text((193, 3507, 2182, 3607))
+        self.insurer_name_l = reader.text((193, 3609, 1450, 3702))
+        return self._is_page_matching()
+
+    def extract(self):
+        self._continue_extracting(self.reader)
+        self._log_extracted_values()
+
+    def get_field_reads(self):
+        return self.reader.fields if self.reader is not None else {}
+
+    def keep_field_reads(self, reads):
+        self.reader.known_fields = reads
+
+    def _continue_extracting(self, reader: PageReader):
+        self.insurance_number_l = reader.digits((1476, 996, 2544, 1122), field='insurance_number_l')
+        self.start_end_l = reader.text((193, 5115, 4788, 5223), field='start_end_l')
+        self.amount_class_l = reader.text((193, 5211, 4788, 5313), field='amount_class_l')
+        self.person_name_l = reader.text((954, 3945, 2728, 4114), field='person_name_l')
+        self.car_number_l = reader.car_number((193, 1306, 1454, 1373), field='car_number_l')
         self.insurance_number_l = remove_slashes(self.insurance_number_l)
 
     def _log_extracted_values(self):
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
         self.logger.debug(
             "contract_name_p: %s, insurer_name_p: %s, insurance_number_p: %s, start_end_p: %s, amount_class_p: %s, person_name_p: %s, car_number_p: %s",
             self.contract_name_l, self.insurer_name_l, self.insurance_number_l, self.start_end_l, self.amount_class_l,
             self.person_name_l, self.car_number_l)
 
-    def is_match(self):
-        return self.is_matching
-
-    def _is_file_name_matching(self):
-        return re.search(self.get_insurer_short_name(), self.file_name, re.IGNORECASE) is not None or \
-               re.search("RO19A19PD", self.file_name, re.IGNORECASE) is not None
-
     def _is_page_matching(self):
         is_rca = is_RCA(self.contract_name_l)
         return is_rca and self.get_insurer_name() == "GROUPAMA ASIGURĂRI"
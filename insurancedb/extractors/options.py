@@ -0,0 +1,95 @@
+from dataclasses import dataclass, replace
+from typing import Dict, Iterable, Optional, Tuple
+
+TEMPLATE_MATCH_METHODS = ('TM_CCOEFF_NORMED', 'TM_CCORR_NORMED', 'TM_SQDIFF_NORMED')
+
+# fields that can be selected, named like the api Policy fields
+FIELDS = ('insurer', 'insurance_number', 'insurance_class', 'contract_date', 'start_date', 'expiration_date',
+          'person_name', 'type', 'car_number', 'insurance_months', 'amount')
+# fields always extracted, they cost nothing and tell the unprocessed documents apart
+IDENTITY_FIELDS = ('insurer', 'type')
+# fields a selected field is computed from
+FIELD_DEPENDENCIES = {'insurance_months': ('start_date', 'expiration_date')}
+# fields read from each ocr crop of the ocr extractors, a crop is skipped when none of them is selected
+OCR_FIELD_SOURCES = {
+    'insurance_number_l': ('insurance_number',),
+    'start_end_l': ('contract_date', 'start_date', 'expiration_date'),
+    'amount_class_l': ('insurance_class', 'amount'),
+    'person_name_l': ('person_name',),
+    'car_number_l': ('car_number',),
+}
+
+
+@dataclass
+class ExtractionOptions:
+    # render resolution of the OCR extractors, crop boxes are defined at BASE_RESOLUTION and scaled to it
+    resolution: int = 600
+    # adaptive ocr: read every field at low_resolution first and re-read it at resolution only when the mean word
+    # confidence reported by tesseract is below min_confidence
+    adaptive_ocr: bool = False
+    low_resolution: int = 300
+    min_confidence: float = 70.0
+    # hybrid mode: read fields from the pdf text layer inside the crop box, ocr only the fields where it is missing or
+    # unparsable
+    text_layer: bool = False
+    # resolution and template threshold of the cheap probe stage
+    probe_resolution: int = 100
+    probe_threshold: float = 0.6
+    # tesseract --oem, None keeps the engine mode tesseract picks for the installed traineddata
+    oem: Optional[int] = None
+    # opencv template matching methods tried by find_position_of_template, the best score of all of them wins
+    match_methods: Tuple[str, ...] = TEMPLATE_MATCH_METHODS
+    # 'none' or 'otsu', binarizes the crops with an otsu threshold before ocr
+    preprocess: str = 'none'
+    # short names of the insurers whose extractors are tried, all when None
+    insurers: Optional[Tuple[str, ...]] = None
+    # page renders a worker keeps in memory, older renders are spilled to memory-mapped temporary files
+    page_memory_mb: int = 512
+    # open pdf files through a memory map instead of buffered reads
+    mmap_input: bool = False
+    # documents a worker processes at the same time in threads: while tesseract reads the fields of one, the next is
+    # parsed, rendered and template matched, so this is also the most tesseract processes a worker runs at a time
+    ocr_jobs: int = 1
+    # fields extracted, see select_fields, all when None
+    fields: Optional[Tuple[str, ...]] = None
+    # a pdf may hold several policies one after the other, each gets a row. The documents of a worker are then
+    # processed one at a time and the policies of a document ocr_jobs at a time
+    split_batches: bool = False
+
+    def wants(self, field: str) -> bool:
+        return self.fields is None or field in self.fields
+
+    def wants_ocr_field(self, ocr_field: str) -> bool:
+        return ocr_field not in OCR_FIELD_SOURCES or any(self.wants(f) for f in OCR_FIELD_SOURCES[ocr_field])
+
+
+PROFILES: Dict[str, ExtractionOptions] = {
+    # daily runs: one render at 300 dpi, the text layer where there is one, a single template matching method
+    'fast': ExtractionOptions(resolution=300, low_resolution=300, text_layer=True, oem=1,
+                              match_methods=('TM_CCOEFF_NORMED',)),
+    # 300 dpi first, fields below the confidence threshold again at 600 dpi
+    'balanced': ExtractionOptions(resolution=600, adaptive_ocr=True, low_resolution=300, text_layer=True,
+                                  match_methods=('TM_CCOEFF_NORMED', 'TM_SQDIFF_NORMED')),
+    # audits: every field ocr-ed from binarized 600 dpi crops, all template matching methods
+    'accurate': ExtractionOptions(resolution=600, preprocess='otsu'),
+}
+
+
+def select_fields(fields: Optional[Iterable[str]]) -> Optional[Tuple[str, ...]]:
+    """The fields with the identity fields and the fields they are computed from, in FIELDS order, None for all."""
+    if fields is None:
+        return None
+    fields = set(fields)
+    unknown = fields - set(FIELDS)
+    if unknown:
+        raise ValueError(f"unknown fields {', '.join(sorted(unknown))}, known: {', '.join(FIELDS)}")
+    fields.update(IDENTITY_FIELDS)
+    for field in list(fields):
+        fields.update(FIELD_DEPENDENCIES.get(field, ()))
+    return tuple(f for f in FIELDS if f in fields)
+
+
+def profile_options(profile: Optional[str], **overrides) -> ExtractionOptions:
+    """Options of the named profile, the defaults without one, with the given fields replaced."""
+    options = PROFILES[profile] if profile is not None else ExtractionOptions()
+    return replace(options, **overrides)
@@ -0,0 +1,80 @@
+import tempfile
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+from PIL import Image
+
+Box = Tuple[int, int, int, int]
+
+
+class PageBuffer:
+    """
+    A rendered pdf page held as one RGB numpy array.
+
+    Crops are numpy views into that array, so PIL, OpenCV template matching and Tesseract input all read the same
+    memory instead of each step keeping its own copy of a ~100 MB 600 DPI page.
+    """
+
+    def __init__(self, array: np.ndarray, resolution: int):
+        self.array = array
+        self.resolution = resolution
+        self._gray = None
+
+    @classmethod
+    def from_pil(cls, pil_img: Image.Image, resolution: int):
+        if pil_img.mode != 'RGB':
+            pil_img = pil_img.convert('RGB')
+        # np.asarray wraps the bytes exported by PIL, after this the PIL image can be released.
+        return cls(np.asarray(pil_img), resolution)
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        height, width = self.array.shape[:2]
+        return width, height
+
+    @property
+    def spilled(self) -> bool:
+        return isinstance(self.array, np.memmap)
+
+    def spill(self, directory: Optional[str] = None):
+        """
+        Moves the pixels to a memory-mapped temporary file, crops then fault in only the rows they cover. The file is
+        unlinked right away, its disk space is freed with the last view of the page.
+        """
+        with tempfile.TemporaryFile(dir=directory) as f:
+            mapped = np.memmap(f, dtype=self.array.dtype, mode='w+', shape=self.array.shape)
+            mapped[:] = self.array
+            mapped.flush()
+        self.array = mapped
+        self._gray = None
+
+    @property
+    def nbytes(self) -> int:
+        gray_nbytes = self._gray.nbytes if self._gray is not None else 0
+        return self.array.nbytes + gray_nbytes
+
+    def crop(self, box: Box) -> np.ndarray:
+        """
+        Same box convention as PIL.Image.crop (left, upper, right, lower), but returns a view. The box is clipped to
+        the page, PIL would pad the outside with black instead.
+        """
+        return self.array[self._slices(box)]
+
+    def gray(self, box: Optional[Box] = None) -> np.ndarray:
+        if self._gray is None:
+            self._gray = cv2.cvtColor(self.array, cv2.COLOR_RGB2GRAY)
+        if box is None:
+            return self._gray
+        return self._gray[self._slices(box)]
+
+    def pil(self, box: Optional[Box] = None) -> Image.Image:
+        """Copies only the requested region, use it when a real PIL image is needed."""
+        return Image.fromarray(self.array if box is None else self.crop(box))
+
+    def _slices(self, box: Box):
+        width, height = self.size
+        left, upper, right, lower = (int(v) for v in box)
+        left, right = max(0, min(left, width)), max(0, min(right, width))
+        upper, lower = max(0, min(upper, height)), max(0, min(lower, height))
+        return slice(upper, lower), slice(left, right)
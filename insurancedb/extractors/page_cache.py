@@ -0,0 +1,116 @@
+import collections
+import itertools
+import logging
+import threading
+import weakref
+from typing import Callable, Optional, Tuple
+
+import pdfplumber
+
+from insurancedb.extractors.page_buffer import PageBuffer
+from insurancedb.extractors.page_range import PageRange
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+# renders kept in memory by a process, a 600 dpi page with its gray copy takes ~140 MB
+DEFAULT_BUDGET_MB = 512
+# spilled renders are dropped past this many times the budget
+SPILL_FACTOR = 4
+
+# (document, page, resolution)
+PageKey = Tuple[int, int, int]
+
+
+class PageCache:
+    """
+    Page renders of the open documents of a process, least recently used first. Past budget_bytes the oldest renders
+    are spilled to memory-mapped temporary files, or dropped when spill is False, so the readers of all the
+    extractors share one render of a page and a worker holds a bounded amount of bitmaps whatever the page count of a
+    document. The renders of a document are dropped when its pdf object is. Safe to use from the document threads of
+    a worker, a page is rendered outside the lock.
+    """
+
+    def __init__(self, budget_bytes: int = DEFAULT_BUDGET_MB * MB, spill: bool = True,
+                 spill_dir: Optional[str] = None):
+        self.budget_bytes = budget_bytes
+        self.spill = spill
+        self.spill_dir = spill_dir
+        self._buffers: 'collections.OrderedDict[PageKey, Optional[PageBuffer]]' = collections.OrderedDict()
+        self._documents = weakref.WeakKeyDictionary()
+        self._ids = itertools.count()
+        # reentrant, the finalizer of a pdf may run in a thread holding the lock
+        self._lock = threading.RLock()
+
+    def get(self, pdf: pdfplumber.PDF, page: int, resolution: int,
+            render: Callable[[], Optional[PageBuffer]]) -> Optional[PageBuffer]:
+        if isinstance(pdf, PageRange):
+            # the policies scanned from each page of a batch pdf share the renders of its pages
+            pdf, page = pdf.pdf, pdf.first + page
+        with self._lock:
+            key = (self._document_id(pdf), page, resolution)
+            if key in self._buffers:
+                self._buffers.move_to_end(key)
+                return self._buffers[key]
+        buffer = render()
+        with self._lock:
+            self._buffers[key] = buffer
+            self._enforce_budget()
+        return buffer
+
+    @property
+    def resident_bytes(self) -> int:
+        # the gray copy of a spilled render is still in memory
+        return sum(b.nbytes - (b.array.nbytes if b.spilled else 0) for b in self._buffers.values() if b is not None)
+
+    @property
+    def spilled_bytes(self) -> int:
+        return sum(b.array.nbytes for b in self._buffers.values() if b is not None and b.spilled)
+
+    def discard(self, document_id: int):
+        with self._lock:
+            for key in [key for key in self._buffers if key[0] == document_id]:
+                del self._buffers[key]
+
+    def _document_id(self, pdf: pdfplumber.PDF) -> int:
+        document_id = self._documents.get(pdf)
+        if document_id is None:
+            document_id = self._documents[pdf] = next(self._ids)
+            weakref.finalize(pdf, self.discard, document_id)
+        return document_id
+
+    def _enforce_budget(self):
+        resident = self.resident_bytes
+        # the newest render stays in memory even alone over budget, it is about to be read
+        for key in list(self._buffers)[:-1]:
+            if resident <= self.budget_bytes:
+                break
+            buffer = self._buffers[key]
+            if buffer is None or buffer.spilled:
+                continue
+            resident -= buffer.nbytes
+            if self.spill:
+                logger.debug("Spilling page render %s of %.0f MB.", key, buffer.nbytes / MB)
+                buffer.spill(self.spill_dir)
+            else:
+                del self._buffers[key]
+        spilled = self.spilled_bytes
+        for key in list(self._buffers):
+            if spilled <= SPILL_FACTOR * self.budget_bytes:
+                break
+            buffer = self._buffers[key]
+            if buffer is not None and buffer.spilled:
+                spilled -= buffer.array.nbytes
+                del self._buffers[key]
+
+
+_cache: Optional[PageCache] = None
+
+
+def page_cache(budget_mb: int = DEFAULT_BUDGET_MB) -> PageCache:
+    """The page cache of this process, with the given budget."""
+    global _cache
+    if _cache is None:
+        _cache = PageCache()
+    _cache.budget_bytes = budget_mb * MB
+    return _cache
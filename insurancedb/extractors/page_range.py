@@ -0,0 +1,43 @@
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+
+import pdfplumber
+
+# the pdf column of a policy of a batch pdf is the path with its pages, 1-based first and last, like the #page= of pdf
+# urls: /pdfs/batch.pdf#pages=4-6
+PAGES_SEPARATOR = '#pages='
+
+
+class PageRange:
+    """
+    Pages first to end of a pdf as a pdf of their own, given to the extractors of one policy of a batch pdf. The pages
+    are the parsed pages of the pdf, a page is still only parsed or rendered when an extractor reads it.
+    """
+
+    def __init__(self, pdf: pdfplumber.PDF, first: int, end: int):
+        self.pdf = pdf
+        self.first = first
+        self.end = end
+
+    @property
+    def pages(self) -> List[pdfplumber.page.Page]:
+        return self.pdf.pages[self.first:self.end]
+
+    def __getattr__(self, name):
+        # metadata, stream and the rest of the pdf
+        if name == 'pdf':
+            raise AttributeError(name)
+        return getattr(self.pdf, name)
+
+
+def page_range_path(pdf_path: Union[str, Path], first: int, end: int) -> str:
+    return f"{pdf_path}{PAGES_SEPARATOR}{first + 1}-{end}"
+
+
+def parse_page_range_path(pdf_column: str) -> Tuple[Path, Optional[Tuple[int, int]]]:
+    """Path and (first, end) pages of a pdf column path, None for a whole pdf."""
+    path, separator, pages = pdf_column.partition(PAGES_SEPARATOR)
+    if not separator:
+        return Path(path), None
+    first, last = pages.split('-')
+    return Path(path), (int(first) - 1, int(last))
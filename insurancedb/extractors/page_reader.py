@@ -0,0 +1,258 @@
+import functools
+import logging
+import re
+from typing import Callable, Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+import pdfplumber
+
+from insurancedb.extractors.calibration import Transform, IDENTITY, layout_key, get_reference, set_reference, \
+    content_box, estimate_transform
+from insurancedb.extractors.extractor_methods import get_pdf_page_buffer, get_image_text_and_confidence_using_ocr, \
+    add_margin, find_position_of_template, load_template, get_pdf_page_text, contains_unparsable_characters, binarize, \
+    with_oem, DIGITS_OCR_CONFIG, RO_CAR_NUMBER_OCR_CONFIG
+from insurancedb.extractors.options import ExtractionOptions
+from insurancedb.extractors.page_buffer import PageBuffer, Box
+from insurancedb.extractors.page_cache import page_cache
+
+logger = logging.getLogger(__name__)
+
+# resolution the crop boxes of the ocr extractors are written for
+BASE_RESOLUTION = 600
+
+TEXT_OCR_CONFIG = r'-l ron --psm 7'
+
+# pdf user space units per inch
+PDF_RESOLUTION = 72
+# words whose tops differ less than this, in pdf units, are on the same line
+LINE_TOLERANCE = 3
+
+# confidence recorded for fields read from the text layer
+TEXT_LAYER_CONFIDENCE = 100.0
+
+# margin around a probe match that is searched again at full resolution, at BASE_RESOLUTION
+TEMPLATE_SEARCH_MARGIN = 120
+
+
+def scale_box(box: Box, factor: float) -> Box:
+    return tuple(int(round(v * factor)) for v in box)
+
+
+def to_pdf_box(box: Box, pdf_page: pdfplumber.page.Page) -> Tuple[float, float, float, float]:
+    """Box at BASE_RESOLUTION to pdf coordinates (x0, top, x1, bottom) of the page."""
+    factor = PDF_RESOLUTION / BASE_RESOLUTION
+    x0, top = float(pdf_page.bbox[0]), float(pdf_page.bbox[1])
+    return tuple(float(v) * factor + offset for v, offset in zip(box, (x0, top, x0, top)))
+
+
+def words_to_text(words) -> str:
+    """Joins pdfplumber words the way tesseract lays out text, words by a space and lines by a new line."""
+    lines = []
+    for word in sorted(words, key=lambda w: (float(w["top"]), float(w["x0"]))):
+        if lines and abs(float(word["top"]) - float(lines[-1][0]["top"])) <= LINE_TOLERANCE:
+            lines[-1].append(word)
+        else:
+            lines.append([word])
+    return "\n".join(" ".join(w["text"] for w in sorted(line, key=lambda w: float(w["x0"]))) for line in lines)
+
+
+@functools.lru_cache(maxsize=None)
+def load_scaled_template(name: str, resolution: int) -> np.ndarray:
+    template = load_template(name)
+    if resolution == BASE_RESOLUTION:
+        return template
+    factor = resolution / BASE_RESOLUTION
+    return cv2.resize(template, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+
+
+class PageReader:
+    """
+    Reads the fields of one pdf page for the ocr extractors. Boxes are given at BASE_RESOLUTION and scaled to the
+    resolution the page is rendered at, renders are lazy and shared with the other readers of the page through the
+    page cache.
+
+    In adaptive mode every field is read from a low resolution render first, only fields whose tesseract confidence
+    is below options.min_confidence are read again from a full resolution render.
+
+    Fields read with a name are recorded in fields with their confidence, fields in known_fields are not read again
+    but taken from there, reprocess sets them to the fields of a previous run that need no second read.
+
+    Extractors with absolute boxes calibrate the reader first, the transform then moves every box read to where the
+    content of a shifted or scaled scan is.
+    """
+
+    def __init__(self, pdf: pdfplumber.PDF, page: int, options: Optional[ExtractionOptions] = None):
+        self.pdf = pdf
+        self.page = page
+        self.options = options if options is not None else ExtractionOptions()
+        self._text_layer = None
+        self._words = None
+        self._content_box = None
+        self.transform: Transform = IDENTITY
+        self.fields: Dict[str, Tuple[str, float]] = {}
+        self.known_fields: Dict[str, Tuple[str, float]] = {}
+
+    def exists(self) -> bool:
+        return len(self.pdf.pages) >= self.page + 1
+
+    def buffer(self, resolution: int) -> Optional[PageBuffer]:
+        return page_cache(self.options.page_memory_mb).get(
+            self.pdf, self.page, resolution, lambda: get_pdf_page_buffer(self.pdf, self.page, resolution))
+
+    @property
+    def layout_resolution(self) -> int:
+        """Resolution used for layout work like template matching."""
+        return self.options.low_resolution if self.options.adaptive_ocr else self.options.resolution
+
+    def crop(self, box: Box, resolution: int) -> np.ndarray:
+        return self.buffer(resolution).crop(scale_box(box, resolution / BASE_RESOLUTION))
+
+    def text_layer(self) -> Optional[str]:
+        """Text layer of the page, None when it is empty or uses fonts that can not be decoded."""
+        if self._text_layer is None:
+            text = get_pdf_page_text(self.pdf, self.page)
+            self._text_layer = "" if contains_unparsable_characters(text) else text.strip()
+        return self._text_layer or None
+
+    def _page_words(self):
+        if self._words is None:
+            self._words = self.pdf.pages[self.page].extract_words()
+        return self._words
+
+    def text_layer_words(self, box: Box) -> str:
+        """Text layer words whose center is inside the box, empty when there are none or they can not be decoded."""
+        x0, top, x1, bottom = to_pdf_box(box, self.pdf.pages[self.page])
+        words = [w for w in self._page_words() if x0 <= (float(w["x0"]) + float(w["x1"])) / 2 <= x1 and
+                 top <= (float(w["top"]) + float(w["bottom"])) / 2 <= bottom]
+        text = words_to_text(words)
+        return "" if contains_unparsable_characters(text) else text
+
+    def find_text_layer_word(self, pattern: str) -> Optional[Box]:
+        """Box at BASE_RESOLUTION of the first text layer word matching the pattern."""
+        pdf_page = self.pdf.pages[self.page]
+        x0, top = float(pdf_page.bbox[0]), float(pdf_page.bbox[1])
+        for word in self._page_words():
+            if re.fullmatch(pattern, word["text"]):
+                box = (float(word["x0"]) - x0, float(word["top"]) - top, float(word["x1"]) - x0,
+                       float(word["bottom"]) - top)
+                return scale_box(box, BASE_RESOLUTION / PDF_RESOLUTION)
+        return None
+
+    def text_layer_lacks(self, keyword: str) -> bool:
+        """True only when the page has a usable text layer and the keyword is not in it."""
+        text = self.text_layer()
+        return text is not None and re.search(keyword, text, re.IGNORECASE) is None
+
+    def find_template(self, name: str, threshold=0.8, resolution: Optional[int] = None,
+                      near: Optional[Box] = None) -> Optional[Box]:
+        """
+        Best match of a resources template, as a box at BASE_RESOLUTION. With near, only the surroundings of that
+        box (e.g. a match found on a thumbnail) are searched.
+        """
+        resolution = resolution or self.layout_resolution
+        factor = resolution / BASE_RESOLUTION
+        image = self.buffer(resolution)
+        left, upper = 0, 0
+        if near is not None:
+            window = scale_box((near[0] - TEMPLATE_SEARCH_MARGIN, near[1] - TEMPLATE_SEARCH_MARGIN,
+                                near[2] + TEMPLATE_SEARCH_MARGIN, near[3] + TEMPLATE_SEARCH_MARGIN), factor)
+            left, upper = max(0, window[0]), max(0, window[1])
+            image = image.gray(window)
+        bbox = find_position_of_template(image, load_scaled_template(name, resolution), threshold,
+                                         methods=self.options.match_methods)
+        if bbox.empty:
+            return None
+        x0, y0, x1, y1 = bbox.iloc[0][0:4]
+        return scale_box((x0 + left, y0 + upper, x1 + left, y1 + upper), 1 / factor)
+
+    def content_box(self) -> Optional[Box]:
+        """Box around the ink of the page, at BASE_RESOLUTION, found on a thumbnail."""
+        if self._content_box is None:
+            resolution = self.options.probe_resolution
+            buffer = self.buffer(resolution)
+            box = content_box(buffer.gray(), resolution / BASE_RESOLUTION) if buffer is not None else None
+            self._content_box = box or ()
+        return self._content_box or None
+
+    def calibrate(self, layout: str) -> bool:
+        """
+        Sets the transform from the reference page of the layout to this page, True when it was set. Pages with a
+        text layer are not scans and keep the identity.
+        """
+        self.transform = IDENTITY
+        if self.options.text_layer and self.text_layer() is not None:
+            return False
+        reference = get_reference(layout_key(layout, self.pdf, self.page))
+        if reference is None:
+            return False
+        actual = self.content_box()
+        transform = estimate_transform(reference, actual) if actual is not None else None
+        if transform is None:
+            logger.debug("Page %d does not align with the %s reference.", self.page, layout)
+            return False
+        logger.debug("Page %d %s transform %s.", self.page, layout, transform)
+        self.transform = transform
+        return True
+
+    def confirm_calibrated(self, layout: str, is_matching: Callable[['PageReader'], bool]) -> bool:
+        """
+        Runs is_matching with the boxes calibrated to the layout and, when that fails, uncalibrated. The first page
+        of a layout matching uncalibrated becomes its reference, the transform is kept for the fields read next.
+        """
+        if self.calibrate(layout) and is_matching(self):
+            return True
+        self.transform = IDENTITY
+        if not is_matching(self):
+            return False
+        if not (self.options.text_layer and self.text_layer() is not None) and self.content_box() is not None:
+            set_reference(layout_key(layout, self.pdf, self.page), self.content_box())
+        return True
+
+    def text(self, box: Box, ocr_config=TEXT_OCR_CONFIG, field: Optional[str] = None) -> str:
+        return self._read_field(field, box, ocr_config)
+
+    def digits(self, box: Box, field: Optional[str] = None) -> str:
+        return self._read_field(field, box, DIGITS_OCR_CONFIG, allowed=r'[\d\s]')
+
+    def car_number(self, box: Box, field: Optional[str] = None) -> str:
+        return self._read_field(field, box, RO_CAR_NUMBER_OCR_CONFIG, margin=10)
+
+    def _read_field(self, field: Optional[str], box: Box, ocr_config: str, margin=0, allowed=None) -> str:
+        if field is not None and not self.options.wants_ocr_field(field):
+            return ""
+        if field in self.known_fields:
+            text, confidence = self.known_fields[field]
+        else:
+            text, confidence = self._read(box, ocr_config, margin, allowed)
+        if field is not None:
+            self.fields[field] = (text, confidence)
+        return text
+
+    def _read(self, box: Box, ocr_config: str, margin=0, allowed=None) -> Tuple[str, float]:
+        box = self.transform.apply(box)
+        ocr_config = with_oem(ocr_config, self.options.oem)
+        if self.options.text_layer:
+            text = self.text_layer_words(box)
+            if allowed is not None:
+                # the same characters the ocr whitelist would allow
+                text = "".join(re.findall(allowed, text))
+            if text.strip():
+                return text, TEXT_LAYER_CONFIDENCE
+            logger.debug("Page %d box %s has no usable text layer, using ocr.", self.page, box)
+        if self.options.adaptive_ocr:
+            image = self._prepare(self.crop(box, self.options.low_resolution), margin)
+            text, confidence = get_image_text_and_confidence_using_ocr(image, ocr_config)
+            if confidence >= self.options.min_confidence:
+                return text, confidence
+            logger.debug("Page %d box %s confidence %.1f at %d dpi, reading again at %d dpi.", self.page, box,
+                         confidence, self.options.low_resolution, self.options.resolution)
+        image = self._prepare(self.crop(box, self.options.resolution), margin)
+        return get_image_text_and_confidence_using_ocr(image, ocr_config)
+
+    def _prepare(self, image: np.ndarray, margin: int) -> np.ndarray:
+        if self.options.preprocess == 'otsu':
+            image = binarize(image)
+        if margin == 0:
+            return image
+        return add_margin(image, margin, margin, margin, margin, 255 if image.ndim == 2 else (255, 255, 255))
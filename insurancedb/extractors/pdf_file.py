@@ -0,0 +1,51 @@
+import mmap
+from pathlib import Path
+from typing import Union
+
+import pdfplumber
+
+
+class MappedPdfFile:
+    """
+    Read-only file object over a memory map of a pdf. The parser reads the objects it needs from the OS page cache
+    instead of through a buffered copy per open file, so the probes and renders of all the extractors and the workers
+    share one cached copy of a large scanned bundle. The name is kept, pdfplumber renders a single page from the file
+    by name, a stream without one would be rendered whole.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.name = str(path)
+        with open(path, 'rb') as f:
+            # the map keeps its own handle of the file
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def read(self, size: int = -1) -> bytes:
+        return self._map.read(size)
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        self._map.seek(offset, whence)
+        return self._map.tell()
+
+    def tell(self) -> int:
+        return self._map.tell()
+
+    def close(self):
+        self._map.close()
+
+
+def open_pdf(path: Union[str, Path], use_mmap: bool = False) -> pdfplumber.PDF:
+    """pdfplumber.open, through a memory map of the file with use_mmap."""
+    if not use_mmap:
+        return pdfplumber.open(path)
+    try:
+        fp = MappedPdfFile(path)
+    except ValueError:
+        # an empty file can not be mapped, pdfplumber raises the usual error for it
+        return pdfplumber.open(path)
+    try:
+        pdf = pdfplumber.open(fp)
+    except Exception:
+        fp.close()
+        raise
+    pdf.close_file = fp.close
+    return pdf
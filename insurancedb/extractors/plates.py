@@ -0,0 +1,52 @@
+import re
+from typing import Iterable, Optional
+
+# two letter county codes, Bucharest (B) has its own number format
+COUNTY_CODES = ('AB', 'AG', 'AR', 'BC', 'BH', 'BN', 'BR', 'BT', 'BV', 'BZ', 'CJ', 'CL', 'CS', 'CT', 'CV', 'DB', 'DJ',
+                'GJ', 'GL', 'GR', 'HD', 'HR', 'IF', 'IL', 'IS', 'MH', 'MM', 'MS', 'NT', 'OT', 'PH', 'SB', 'SJ', 'SM',
+                'SV', 'TL', 'TM', 'TR', 'VL', 'VN', 'VS')
+
+
+def county_codes_pattern(codes: Iterable[str]) -> str:
+    """
+    Alternation of the codes factored by a prefix trie, e.g. AB|AG|AR -> A[BGR]. The regex engine then branches on
+    the first letter once instead of trying every code at every position of the text.
+    """
+    trie = {}
+    for code in sorted(codes):
+        node = trie
+        for letter in code:
+            node = node.setdefault(letter, {})
+
+    def to_pattern(node) -> str:
+        branches = []
+        for letter, child in node.items():
+            if not child:
+                branches.append(letter)
+            else:
+                branches.append(letter + to_pattern(child))
+        if all(len(b) == 1 for b in branches) and len(branches) > 1:
+            return '[' + ''.join(branches) + ']'
+        if len(branches) == 1:
+            return branches[0]
+        return '(?:' + '|'.join(branches) + ')'
+
+    return to_pattern(trie)
+
+
+# same matches as the plain alternation of all codes, county codes are tried before Bucharest
+CAR_NUMBER_REGEX = re.compile(r'(' + county_codes_pattern(COUNTY_CODES) + r'\s*[0-9]{2}\s*[A-Z]{3}'
+                              r'|B\s*[0-9]{2,3}\s*[A-Z]{3})')
+
+
+def find_car_number(text: str) -> Optional[str]:
+    """First romanian car number in the text, spaces inside it are tolerated, as a plate key."""
+    match = CAR_NUMBER_REGEX.search(text)
+    if match:
+        return plate_key(match.group(1))
+    return None
+
+
+def plate_key(car_number: str) -> str:
+    """Normalized form used to compare and index car numbers: upper case letters and digits only."""
+    return re.sub(r'[^A-Z0-9]', '', car_number.upper())
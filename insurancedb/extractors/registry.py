@@ -1,14 +1,146 @@
 import functools
-from typing import Dict
+import importlib
+import logging
+import re
+import warnings
+from dataclasses import dataclass
+from importlib.metadata import entry_points
+from typing import Dict, Iterable, List, Optional, Tuple, Type
 
 from insurancedb.extractors.base import BaseRcaExtractor
 
-extractors_registry_map: Dict[str, BaseRcaExtractor.__class__] = {}
+logger = logging.getLogger(__name__)
 
+# entry point group of extractor plugins, an entry point loads the ExtractorSpec of one extractor, e.g. in setup.py
+# entry_points={'insurancedb.extractors': ['acme = acme_rca.specs:ACME']}
+ENTRY_POINT_GROUP = 'insurancedb.extractors'
 
-def register(cls):
-    extractors_registry_map[cls.__name__.lower()] = cls
+COST_CLASS_TEXT = 'text'
+COST_CLASS_OCR = 'ocr'
+
+
+@dataclass(frozen=True)
+class ExtractorSpec:
+    """
+    What is known about an extractor without importing its module: the extractor class is only imported for files
+    whose name matches the file name hints.
+    """
+    # insurer short name, used by --insurers
+    insurer: str
+    # 'module:Class' of the extractor
+    target: str
+    # regexes, one of them is in the file name of every pdf the extractor handles, empty when it handles any name
+    file_name_hints: Tuple[str, ...] = ()
+    # pages the extractor reads
+    pages: Tuple[int, ...] = (0,)
+    cost_class: str = COST_CLASS_TEXT
+
+    @property
+    def name(self) -> str:
+        return self.insurer.lower()
+
+    def matches_file_name(self, file_name: str) -> bool:
+        return not self.file_name_hints or \
+               any(re.search(hint, file_name, re.IGNORECASE) is not None for hint in self.file_name_hints)
+
+    def load(self) -> Type[BaseRcaExtractor]:
+        return _load_target(self.target)
+
+
+BUILTIN_EXTRACTORS = (
+    ExtractorSpec('AXERIA', 'insurancedb.extractors.ocr:AxeriaRcaExtractor', ('AXERIA', 'RO31N31JT'), (2,),
+                  COST_CLASS_OCR),
+    ExtractorSpec('ALLIANZ', 'insurancedb.extractors.ocr:AllianzRcaExtractor', ('ALLIANZ', 'RO07R7YD'), (0, 2),
+                  COST_CLASS_OCR),
+    ExtractorSpec('GROUPAMA', 'insurancedb.extractors.ocr:GroupamaRcaExtractor', ('GROUPAMA', 'RO19A19PD'), (0,),
+                  COST_CLASS_OCR),
+    ExtractorSpec('EUROINS', 'insurancedb.extractors.simple:EuroInsRcaExtractor', ('EUROINS', 'RO16H16DV')),
+    ExtractorSpec('CITY', 'insurancedb.extractors.simple:CityInsuranceRcaExtractor', ('CITY', 'RO25C25HP')),
+    ExtractorSpec('GRAWE', 'insurancedb.extractors.simple:GraweRcaExtractor'),
+    ExtractorSpec('ASIROM', 'insurancedb.extractors.simple:AsiromRcaExtractor', ('ASIROM', 'XZ')),
+    ExtractorSpec('GENERALI', 'insurancedb.extractors.simple:GeneraliRcaExtractor', ('GENERALI', 'RO05M3NP'), (4,)),
+    ExtractorSpec('OMNIASIG', 'insurancedb.extractors.simple:OmniasigRcaExtractor'),
+)
+
+# specs of the classes given to the deprecated register
+_registered: List[ExtractorSpec] = []
+
+
+@functools.lru_cache(maxsize=None)
+def _load_target(target: str) -> Type[BaseRcaExtractor]:
+    module_name, class_name = target.split(':')
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def _entry_points():
+    eps = entry_points()
+    if hasattr(eps, 'select'):
+        return eps.select(group=ENTRY_POINT_GROUP)
+    return eps.get(ENTRY_POINT_GROUP, [])
+
+
+@functools.lru_cache(maxsize=None)
+def extractor_specs() -> Tuple[ExtractorSpec, ...]:
+    """The built in extractors followed by the installed plugins."""
+    specs = list(BUILTIN_EXTRACTORS) + _registered
+    for entry_point in _entry_points():
+        try:
+            spec = entry_point.load()
+        except Exception:
+            logger.exception("Could not load the extractor plugin %s.", entry_point.name)
+            continue
+        if not isinstance(spec, ExtractorSpec):
+            logger.error("Extractor plugin %s is not an ExtractorSpec.", entry_point.name)
+            continue
+        specs.append(spec)
+    return tuple(specs)
+
+
+def select_specs(insurers: Optional[Iterable[str]] = None) -> List[ExtractorSpec]:
+    """Specs of the given insurers, by short name in any case, all of them when insurers is None."""
+    if insurers is None:
+        return list(extractor_specs())
+    names = {insurer.lower() for insurer in insurers}
+    return [spec for spec in extractor_specs() if spec.name in names]
+
+
+def insurer_names() -> List[str]:
+    return [spec.name for spec in extractor_specs()]
+
+
+def _target_of(cls: Type[BaseRcaExtractor]) -> str:
+    return f"{cls.__module__}:{cls.__qualname__}"
+
+
+@functools.lru_cache(maxsize=None)
+def _specs_by_target() -> Dict[str, ExtractorSpec]:
+    return {spec.target: spec for spec in extractor_specs()}
+
+
+def spec_of(cls: Type[BaseRcaExtractor]) -> ExtractorSpec:
+    """The spec of an extractor class, its file name hints and pages are only written there."""
+    try:
+        return _specs_by_target()[_target_of(cls)]
+    except KeyError:
+        raise LookupError(f"No extractor spec targets {_target_of(cls)}.") from None
+
+
+def register(cls: Type[BaseRcaExtractor]) -> Type[BaseRcaExtractor]:
+    """Deprecated, add an ExtractorSpec to an entry point instead. Registers cls for any file name and page 0."""
+    warnings.warn("register is deprecated, declare an ExtractorSpec in the insurancedb.extractors entry point group.",
+                  DeprecationWarning, stacklevel=2)
+    _registered.append(ExtractorSpec(cls.__name__.upper(), _target_of(cls)))
+    extractor_specs.cache_clear()
+    _specs_by_target.cache_clear()
     return cls
 
 
-extractor_register = functools.partial(register)
+extractor_register = register
+
+
+def __getattr__(name):
+    # the extractor classes by lower case class name, as before the specs, every extractor module is imported
+    if name == 'extractors_registry_map':
+        warnings.warn("extractors_registry_map is deprecated, use extractor_specs.", DeprecationWarning, stacklevel=2)
+        return {spec.load().__name__.lower(): spec.load() for spec in extractor_specs()}
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
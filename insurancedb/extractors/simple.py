@@ -3,27 +3,27 @@ from dataclasses import dataclass
 
 import pdfplumber
 
-from insurancedb.extractors.base import BaseRcaExtractor
+from insurancedb.extractors.base import BaseRcaExtractor, COST_FILE
 from insurancedb.extractors.extractor_methods import get_pdf_page_text, is_RCA, clean_text, get_date, get_car_number
-from insurancedb.extractors.registry import extractor_register
+from insurancedb.extractors.options import ExtractionOptions
 
 
-@extractor_register
 @dataclass
 class EuroInsRcaExtractor(BaseRcaExtractor):
     file_name: str
     pdf: pdfplumber.PDF = None
+    options: ExtractionOptions = None
+
+    probe_cost = COST_FILE
 
     def __post_init__(self):
         self.text = ""
-        if self._is_file_name_matching():
-            self.text = get_pdf_page_text(self.pdf, 0)
 
-    def _is_file_name_matching(self):
-        return re.search(self.get_insurer_short_name(), self.file_name, re.IGNORECASE) is not None or \
-               re.search("RO16H16DV", self.file_name, re.IGNORECASE) is not None
+    def probe(self):
+        return self._is_file_name_matching()
 
-    def is_match(self):
+    def confirm(self):
+        self.text = get_pdf_page_text(self.pdf, self.spec.pages[0])
         is_rca = is_RCA(self.text)
         return is_rca and self.get_insurer_name() == "EUROINS ROMÂNIA ASIGURARE REASIGURARE S.A."
 
@@ -79,19 +79,18 @@ class EuroInsRcaExtractor(BaseRcaExtractor):
 
 
 @dataclass
-@extractor_register
 class CityInsuranceRcaExtractor(BaseRcaExtractor):
     file_name: str
     pdf: pdfplumber.PDF = None
+    options: ExtractionOptions = None
+
+    probe_cost = COST_FILE
 
     def __post_init__(self):
         self.text = ""
-        if self._is_file_name_matching():
-            self.text = get_pdf_page_text(self.pdf, 0)
 
-    def _is_file_name_matching(self):
-        return re.search(self.get_insurer_short_name(), self.file_name, re.IGNORECASE) is not None or \
-               re.search("RO25C25HP", self.file_name, re.IGNORECASE) is not None
+    def probe(self):
+        return self._is_file_name_matching()
 
     def get_expiration_date(self):
         return get_date(self.text, r'pana la(.*)/(.*)/(.*)Contract')
@@ -140,7 +139,8 @@ class CityInsuranceRcaExtractor(BaseRcaExtractor):
     def get_insurer_short_name(self):
         return "CITY"
 
-    def is_match(self):
+    def confirm(self):
+        self.text = get_pdf_page_text(self.pdf, self.spec.pages[0])
         is_rca = is_RCA(self.text)
         return is_rca and self.get_insurer_name() == "CITY INSURANCE S.A."
 
@@ -149,13 +149,13 @@ class CityInsuranceRcaExtractor(BaseRcaExtractor):
 
 
 @dataclass
-@extractor_register
 class GraweRcaExtractor(BaseRcaExtractor):
     file_name: str
     pdf: pdfplumber.PDF = None
+    options: ExtractionOptions = None
 
     def __post_init__(self):
-        self.text = get_pdf_page_text(self.pdf, 0)
+        self.text = ""
 
     def get_expiration_date(self):
         return get_date(self.text, r'până la(.*)\.(.*)\.(.*)Contract')
@@ -205,7 +205,8 @@ class GraweRcaExtractor(BaseRcaExtractor):
     def get_insurer_short_name(self):
         return "GRAWE"
 
-    def is_match(self):
+    def confirm(self):
+        self.text = get_pdf_page_text(self.pdf, self.spec.pages[0])
         is_rca = is_RCA(self.text)
         return is_rca and self.get_insurer_name() == "GRAWE România Asigurare SA"
 
@@ -213,22 +214,22 @@ class GraweRcaExtractor(BaseRcaExtractor):
         return get_car_number(self.text)
 
 
-@extractor_register
 @dataclass
 class AsiromRcaExtractor(BaseRcaExtractor):
     file_name: str
     pdf: pdfplumber.PDF = None
+    options: ExtractionOptions = None
+
+    probe_cost = COST_FILE
 
     def __post_init__(self):
         self.text = ""
-        if self._is_file_name_matching():
-            self.text = get_pdf_page_text(self.pdf, 0)
 
-    def _is_file_name_matching(self):
-        return re.search(self.get_insurer_short_name(), self.file_name, re.IGNORECASE) is not None or \
-               re.search("XZ", self.file_name, re.IGNORECASE) is not None
+    def probe(self):
+        return self._is_file_name_matching()
 
-    def is_match(self):
+    def confirm(self):
+        self.text = get_pdf_page_text(self.pdf, self.spec.pages[0])
         is_rca = is_RCA(self.text)
         return is_rca and self.get_insurer_name() == "ASIROM VIENNA INSURANCE GROUP"
 
@@ -283,22 +284,22 @@ class AsiromRcaExtractor(BaseRcaExtractor):
             return None
 
 
-@extractor_register
 @dataclass
 class GeneraliRcaExtractor(BaseRcaExtractor):
     file_name: str
     pdf: pdfplumber.PDF = None
+    options: ExtractionOptions = None
+
+    probe_cost = COST_FILE
 
     def __post_init__(self):
         self.text = ""
-        if self._is_file_name_matching():
-            self.text = get_pdf_page_text(self.pdf, 4)
 
-    def _is_file_name_matching(self):
-        return re.search(self.get_insurer_short_name(), self.file_name, re.IGNORECASE) is not None or \
-               re.search("RO05M3NP", self.file_name, re.IGNORECASE) is not None
+    def probe(self):
+        return self._is_file_name_matching()
 
-    def is_match(self):
+    def confirm(self):
+        self.text = get_pdf_page_text(self.pdf, self.spec.pages[0])
         is_rca = is_RCA(self.text)
         return is_rca and self.get_insurer_name() == "GENERALI ROMANIA ASIGURARE REASIGURARE"
 
@@ -353,16 +354,17 @@ class GeneraliRcaExtractor(BaseRcaExtractor):
             return None
 
 
-@extractor_register
 @dataclass
 class OmniasigRcaExtractor(BaseRcaExtractor):
     file_name: str
     pdf: pdfplumber.PDF = None
+    options: ExtractionOptions = None
 
     def __post_init__(self):
-        self.text = get_pdf_page_text(self.pdf, 0)
+        self.text = ""
 
-    def is_match(self):
+    def confirm(self):
+        self.text = get_pdf_page_text(self.pdf, self.spec.pages[0])
         is_rca = is_RCA(self.text)
         return is_rca and self.get_insurer_name() == "OMNIASIG VIENNA INSURANCE GROUP"
 
@@ -1,55 +1,214 @@
+import concurrent.futures
+import functools
+import json
 import logging
 from pathlib import Path
-from typing import List
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 
 import pdfplumber
 
-from insurancedb.extractors.registry import extractors_registry_map
-from insurancedb.extractors.extractor_methods import diff_months
+from insurancedb.extractors.base import BaseRcaExtractor
+from insurancedb.extractors.options import ExtractionOptions
+from insurancedb.extractors.page_range import PageRange, page_range_path
+from insurancedb.extractors.pdf_file import open_pdf
+from insurancedb.extractors.registry import ExtractorSpec, select_specs
+from insurancedb.journal import Journal
+from insurancedb.row_batch import RowBatch
+from insurancedb.shared_batch import SharedBatch, share_batch
 
 logger = logging.getLogger(__name__)
 
 
-def process_paths(paths: List[Path]):
+def select_extractor(extractors: List[BaseRcaExtractor]) -> Optional[BaseRcaExtractor]:
+    """
+    Runs the cheap probe of every candidate before any confirm, then confirms the survivors cheapest first, so an
+    expensive stage only runs for documents the cheap checks could not tell apart.
+    """
+    candidates = [extractor for extractor in sorted(extractors, key=lambda e: e.probe_cost) if extractor.probe()]
+    for extractor in sorted(candidates, key=lambda e: e.confirm_cost):
+        if extractor.confirm():
+            return extractor
+    return None
+
+
+def extract_pdf(file_name: str, pdf: pdfplumber.PDF, options: Optional[ExtractionOptions] = None,
+                specs: Optional[List[ExtractorSpec]] = None,
+                field_reads: Optional[Dict[str, Tuple[str, float]]] = None) -> Optional[BaseRcaExtractor]:
+    """
+    The extractor that handles the pdf, with its fields extracted, None when no extractor does. Only the extractors
+    whose file name hints match are imported and probed. Fields in field_reads, from a previous run, are not read
+    again.
+    """
+    if specs is None:
+        specs = select_specs(options.insurers if options is not None else None)
+    extractor = select_extractor([spec.load()(file_name, pdf, options) for spec in specs
+                                  if spec.matches_file_name(file_name)])
+    if extractor is not None:
+        if field_reads:
+            extractor.keep_field_reads(field_reads)
+        extractor.extract()
+    return extractor
+
+
+def extractor_row(extractor: BaseRcaExtractor, pdf_path: Union[Path, str],
+                  options: Optional[ExtractionOptions] = None) -> List:
+    # NR.CRT
+    # ASIGURATOR
+    # NUMAR POLITA
+    # CLASA B/M
+    # DATA EMITERE
+    # DATA EXPIRARE
+    # NUME CLIENT
+    # NUMAR DE TELEFON
+    # TIP ASIGURARE
+    # NUMAR INMATRICULARE
+    # PERIODA DE ASIGURARE
+    # VALOARE POLITA - prima de asigurare (totala)
+    # PDF
+    # DATA INCEPUT - PERIODA DE ASIGURARE is computed from it for the whole result set by the exporter
+    # CAMPURI OCR - raw text and confidence of the ocr fields, for reprocess
+    def get(field):
+        # the getters of the fields not selected are not run
+        return extractor.get_field(field) if options is None or options.wants(field) else None
+
+    field_reads = extractor.get_field_reads()
+    return [get('insurer'), get('insurance_number'),
+            get('insurance_class'),
+            get('contract_date'), get('expiration_date'),
+            get('person_name'), None, get('type'),
+            get('car_number'), None,
+            get('amount'), str(pdf_path), get('start_date'),
+            json.dumps(field_reads, ensure_ascii=False) if field_reads else None]
+
+
+def unprocessed_row(pdf_path: Path, pdf_column: Optional[str] = None) -> List:
+    """pdf_column is the pdf column of the row, the file name by default."""
+    return [f"Unprocessed {str(pdf_path)}", None, None, None, None, None, None, None, None, None, None,
+            pdf_column or pdf_path.name, None, None]
+
+
+def process_path(pdf_path: Path, options: Optional[ExtractionOptions] = None) -> List:
+    with open_pdf(pdf_path, options is not None and options.mmap_input) as pdf:
+        extractor = extract_pdf(pdf_path.name, pdf, options)
+        if extractor is not None:
+            logger.info("%s :-> %s", extractor.__class__.__name__, pdf_path)
+            return extractor_row(extractor, pdf_path, options)
+        return unprocessed_row(pdf_path)
+
+
+def find_policies(file_name: str, pdf: pdfplumber.PDF, options: Optional[ExtractionOptions] = None) \
+        -> List[Tuple[int, int, BaseRcaExtractor]]:
+    """
+    (first page, end page, confirmed extractor) of each policy of a pdf holding policies one after the other. A policy
+    starts at a page when an extractor confirms the pages from there on, the next one is looked for past the page the
+    extractor confirmed on, so a header on the third page of a policy is not taken for another policy. Pages no
+    extractor confirms belong to the policy before them, the ones before the first policy are skipped. Only the pages
+    read by the probes and confirms are parsed or rendered.
+    """
+    specs = [spec for spec in select_specs(options.insurers if options is not None else None)
+             if spec.matches_file_name(file_name)]
+    extractor_classes = [spec.load() for spec in specs]
+    page_count = len(pdf.pages)
+    starts = []
+    page = 0
+    while page < page_count:
+        view = PageRange(pdf, page, page_count)
+        extractor = select_extractor([cls(file_name, view, options) for cls in extractor_classes])
+        if extractor is None:
+            page += 1
+            continue
+        starts.append((page, extractor))
+        page += extractor.get_confirmed_page() + 1
+    if starts and starts[0][0] > 0:
+        logger.warning("Pages 1-%d of %s match no extractor.", starts[0][0], file_name)
+    ends = [first for first, _ in starts[1:]] + [page_count]
+    return [(first, end, extractor) for (first, extractor), end in zip(starts, ends)]
+
+
+def process_batch_path(pdf_path: Path, options: ExtractionOptions) -> List[List]:
+    """
+    Rows of the policies of a pdf, found on one pass over its pages. A pdf of a single policy gets the row process_path
+    gives it. With options.ocr_jobs above 1 the policies are extracted in threads, each on its own handle of the file,
+    the parser is not shared, where its extractor confirms its pages again before reading the fields.
+    """
+    with open_pdf(pdf_path, options.mmap_input) as pdf:
+        policies = find_policies(pdf_path.name, pdf, options)
+        if not policies:
+            return [unprocessed_row(pdf_path)]
+        if len(policies) == 1 and policies[0][0] == 0:
+            extractor = policies[0][2]
+            extractor.extract()
+            logger.info("%s :-> %s", extractor.__class__.__name__, pdf_path)
+            return [extractor_row(extractor, pdf_path, options)]
+        logger.info("%d policies in %s.", len(policies), pdf_path)
+        jobs = min(options.ocr_jobs, len(policies))
+        if jobs <= 1:
+            rows = []
+            for first, end, extractor in policies:
+                extractor.extract()
+                rows.append(_policy_row(extractor, pdf_path, first, end, options))
+            return rows
+    with concurrent.futures.ThreadPoolExecutor(jobs, thread_name_prefix='policy') as executor:
+        return list(executor.map(functools.partial(process_policy, pdf_path, options=options), policies))
+
+
+def process_policy(pdf_path: Path, policy: Tuple[int, int, BaseRcaExtractor], options: ExtractionOptions) -> List:
+    """Row of a policy found by find_policies, extracted on a handle of the file of its own."""
+    first, end, found = policy
+    extractor_class = type(found)
+    with open_pdf(pdf_path, options.mmap_input) as pdf:
+        extractor = select_extractor([extractor_class(pdf_path.name, PageRange(pdf, first, end), options)])
+        if extractor is None:
+            logger.warning("%s no longer confirms pages %d-%d of %s.", extractor_class.__name__, first + 1, end,
+                           pdf_path)
+            pdf_column = page_range_path(pdf_path, first, end)
+            return unprocessed_row(Path(pdf_column), pdf_column)
+        extractor.extract()
+        return _policy_row(extractor, pdf_path, first, end, options)
+
+
+def _policy_row(extractor: BaseRcaExtractor, pdf_path: Path, first: int, end: int, options: ExtractionOptions) -> List:
+    logger.info("%s :-> %s pages %d-%d", extractor.__class__.__name__, pdf_path, first + 1, end)
+    return extractor_row(extractor, page_range_path(pdf_path, first, end), options)
+
+
+def process_paths(paths: List[Path], options: Optional[ExtractionOptions] = None,
+                  journal: Optional[Journal] = None) -> RowBatch:
+    """
+    Rows of the pdfs, in the order of paths, a row per policy with options.split_batches. With options.ocr_jobs above
+    1 that many documents are processed at the same time in threads, tesseract runs in its own process and opencv and
+    the renderer release the gil, so the worker keeps its cpu busy while one document waits for tesseract.
+    """
     logger.info("Processing %d files.", len(paths))
     data = []
-    for pdf_path in paths:
-        with pdfplumber.open(pdf_path) as pdf:
-            processed = False
-            for extractor_key, extractor_cls in extractors_registry_map.items():
-                extractor = extractor_cls(pdf_path.name, pdf)
-                if extractor.is_match():
-                    processed = True
-                    logger.info("%s :-> %s", extractor_cls.__name__, {str(pdf_path)})
-                    # NR.CRT
-                    # ASIGURATOR
-                    # NUMAR POLITA
-                    # CLASA B/M
-                    # DATA EMITERE
-                    # DATA EXPIRARE
-                    # NUME CLIENT
-                    # NUMAR DE TELEFON
-                    # TIP ASIGURARE
-                    # NUMAR INMATRICULARE
-                    # PERIODA DE ASIGURARE
-                    # VALOARE POLITA - prima de asigurare (totala)
-                    # PDF
-                    start_date = extractor.get_start_date()
-                    expiration_date = extractor.get_expiration_date()
-                    interval = diff_months(expiration_date, start_date)
-
-                    pdf_data = [extractor.get_insurer_short_name(), extractor.get_insurance_number(),
-                                extractor.get_insurance_class(),
-                                extractor.get_contract_date(), expiration_date,
-                                extractor.get_person_name(), None, extractor.get_type(),
-                                extractor.get_car_number(), interval,
-                                extractor.get_insurance_amount(), str(pdf_path)]
-
-                    data.append(pdf_data)
-                    break
-            if not processed:
-                pdf_data = [f"Unprocessed {str(pdf_path)}", None, None, None, None, None, None, None, None, None, None,
-                            pdf_path.name]
-                data.append(pdf_data)
-
-    return data
+    counts = []
+    for pdf_path, rows in zip(paths, _process_in_order(paths, options)):
+        data.extend(rows)
+        counts.append(len(rows))
+        if journal is not None:
+            journal.record(pdf_path, rows)
+
+    return RowBatch.from_rows(data, counts)
+
+
+def _process_in_order(paths: List[Path], options: Optional[ExtractionOptions]) -> Iterator[List[List]]:
+    """The rows of each path, in the order of paths."""
+    if options is not None and options.split_batches:
+        # the ocr_jobs threads extract the policies of one document
+        for pdf_path in paths:
+            yield process_batch_path(pdf_path, options)
+        return
+    jobs = min(options.ocr_jobs if options is not None else 1, len(paths))
+    if jobs <= 1:
+        for pdf_path in paths:
+            yield [process_path(pdf_path, options)]
+        return
+    with concurrent.futures.ThreadPoolExecutor(jobs, thread_name_prefix='document') as executor:
+        for row in executor.map(functools.partial(process_path, options=options), paths):
+            yield [row]
+
+
+def process_paths_shared(paths: List[Path], options: Optional[ExtractionOptions] = None,
+                         journal: Optional[Journal] = None) -> Union[SharedBatch, RowBatch]:
+    """process_paths for pool workers, the rows go back to the parent through shared memory."""
+    return share_batch(process_paths(paths, options, journal))
@@ -0,0 +1,136 @@
+import hashlib
+import logging
+import re
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+import pdfplumber
+
+from insurancedb.extractors.extractor_methods import get_pdf_page_text, contains_unparsable_characters, \
+    get_pdf_page_buffer
+from insurancedb.extractors.page_range import PAGES_SEPARATOR
+from insurancedb.row_batch import RowBatch
+
+logger = logging.getLogger(__name__)
+
+# resolution of the page 0 thumbnail hashed when the page has no usable text
+THUMBNAIL_RESOLUTION = 36
+# max differing bits of two thumbnail hashes to flag the documents as near duplicates
+NEAR_DUPLICATE_DISTANCE = 6
+
+
+class Fingerprint(NamedTuple):
+    path: Path
+    # hash of the file bytes, equal for copies of the same file
+    byte_hash: str
+    # 't:' hash of the page 0 text or 'i:' 64 bit difference hash of a page 0 thumbnail, equal or close for the same
+    # document saved again, re-sent or re-scanned
+    page_hash: Optional[str]
+
+
+class Duplicates(NamedTuple):
+    # copies by the path that is processed for all of them
+    copies: Dict[Path, List[Path]]
+    # (path, path, differing bits) of documents that are probably the same policy
+    near: List[Tuple[Path, Path, int]]
+
+
+def byte_hash(path: Path, chunk_size=1 << 20) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def difference_hash(gray: np.ndarray) -> int:
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(''.join('1' if b else '0' for b in bits), 2)
+
+
+def page_hash(pdf: pdfplumber.PDF) -> Optional[str]:
+    text = get_pdf_page_text(pdf, 0)
+    if text.strip() and not contains_unparsable_characters(text):
+        normalized = re.sub(r'\s+', ' ', text).strip()
+        return 't:' + hashlib.blake2b(normalized.encode('utf-8'), digest_size=16).hexdigest()
+    page = get_pdf_page_buffer(pdf, 0, THUMBNAIL_RESOLUTION)
+    if page is None:
+        return None
+    return 'i:%016x' % difference_hash(page.gray())
+
+
+def fingerprint(path: Path) -> Fingerprint:
+    digest = byte_hash(path)
+    try:
+        with pdfplumber.open(path) as pdf:
+            return Fingerprint(path, digest, page_hash(pdf))
+    except Exception:
+        logger.exception("Could not hash the first page of %s.", path)
+        return Fingerprint(path, digest, None)
+
+
+def fingerprint_paths(paths: List[Path]) -> List[Fingerprint]:
+    return [fingerprint(path) for path in paths]
+
+
+def find_duplicates(fingerprints: List[Fingerprint]) -> Duplicates:
+    copies = defaultdict(list)
+    by_byte_hash = {}
+    for fp in fingerprints:
+        if fp.byte_hash in by_byte_hash:
+            copies[by_byte_hash[fp.byte_hash].path].append(fp.path)
+        else:
+            by_byte_hash[fp.byte_hash] = fp
+    unique = list(by_byte_hash.values())
+    return Duplicates(dict(copies), _find_near_duplicates(unique))
+
+
+def _find_near_duplicates(fingerprints: List[Fingerprint]) -> List[Tuple[Path, Path, int]]:
+    near = []
+    by_text = defaultdict(list)
+    # thumbnail hashes are bucketed by each of their four 16 bit bands, two hashes within NEAR_DUPLICATE_DISTANCE
+    # bits share at least one band, so only documents in the same bucket are compared
+    bands = defaultdict(list)
+    for fp in fingerprints:
+        if fp.page_hash is None:
+            continue
+        if fp.page_hash.startswith('t:'):
+            by_text[fp.page_hash].append(fp)
+        else:
+            value = int(fp.page_hash[2:], 16)
+            for band in range(4):
+                bands[(band, (value >> (16 * band)) & 0xFFFF)].append((fp, value))
+    for same_text in by_text.values():
+        near.extend((same_text[0].path, fp.path, 0) for fp in same_text[1:])
+    seen = set()
+    for bucket in bands.values():
+        for i, (fp_a, value_a) in enumerate(bucket):
+            for fp_b, value_b in bucket[i + 1:]:
+                distance = bin(value_a ^ value_b).count('1')
+                pair = (fp_a.path, fp_b.path)
+                if distance <= NEAR_DUPLICATE_DISTANCE and pair not in seen:
+                    seen.add(pair)
+                    near.append((fp_a.path, fp_b.path, distance))
+    return near
+
+
+def attach_copies(batch: RowBatch, row_paths: List[str], copies: Dict[Path, List[Path]]) -> RowBatch:
+    """The rows of a processed document list the paths of all its copies in the pdf column, row_paths is the path of
+    each document of the batch, in order, and batch.row_counts its number of rows. A row of a policy of a batch pdf
+    has the pages of the policy after each path."""
+    copies = {str(path): copy_paths for path, copy_paths in copies.items()}
+    pdf_column = batch.columns["POLITA PDF"]
+    ends = np.cumsum(batch.row_counts)
+    for path, first, end in zip(row_paths, ends - batch.row_counts, ends):
+        copy_paths = copies.get(path)
+        if copy_paths is None:
+            continue
+        for j in range(first, end):
+            _, separator, pages = str(pdf_column[j]).partition(PAGES_SEPARATOR)
+            pages = f"{separator}{pages}"
+            pdf_column[j] = " | ".join([f"{path}{pages}"] + [f"{p}{pages}" for p in copy_paths])
+    return batch
@@ -0,0 +1,210 @@
+import dataclasses
+import json
+import logging
+import logging.config
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import pandas as pd
+import pytesseract
+
+from insurancedb.exporters.file_exporter import read_db, to_csv
+from insurancedb.extractors.options import ExtractionOptions
+from insurancedb.extractors.registry import select_specs
+from insurancedb.file_processor import process_paths
+from insurancedb.log.config import get_log_config
+from insurancedb.row_batch import RowBatch
+
+logger = logging.getLogger(__name__)
+
+# expected db.csv of the corpus, without NR.CRT and with the pdf paths relative to the corpus dir
+EXPECTED_FILE = 'expected.csv'
+# seconds and peak traced memory of every extractor when the corpus was recorded
+BUDGETS_FILE = 'budgets.json'
+UNPROCESSED = 'Unprocessed'
+# a budget is exceeded by more than the tolerance and these, the timings of a few milliseconds are noise
+SLACK_SECONDS = 0.05
+SLACK_MB = 5.0
+
+
+class Cost(NamedTuple):
+    """Documents of an extractor in the corpus, the sum of their best seconds and their largest peak traced MB."""
+    documents: int
+    seconds: float
+    peak_mb: float
+
+
+class Mismatch(NamedTuple):
+    mode: str
+    pdf: str
+    column: str
+    expected: str
+    actual: str
+
+
+class OverBudget(NamedTuple):
+    extractor: str
+    measure: str
+    budget: float
+    actual: float
+
+
+def corpus_paths(corpus_dir: Path) -> List[Path]:
+    return sorted(corpus_dir.rglob("*.pdf"))
+
+
+def tesseract_version() -> Optional[str]:
+    """Version of the local tesseract, None without one. Timings of another version are not comparable."""
+    try:
+        return str(pytesseract.get_tesseract_version())
+    except (pytesseract.TesseractNotFoundError, OSError):
+        return None
+
+
+def extractor_names(options: ExtractionOptions) -> Dict[str, str]:
+    """Extractor class name by insurer short name, the ASIGURATOR column of a row, from the specs, without imports."""
+    return {spec.insurer: spec.target.split(':')[1] for spec in select_specs(options.insurers)}
+
+
+def run_serial(paths: List[Path], options: ExtractionOptions, repeat: int) -> Tuple[RowBatch, Dict[str, Cost]]:
+    """
+    Rows of the pdfs and the cost of each extractor. A first run under tracemalloc gives the rows and the peak memory
+    of every document, its seconds are the best of repeat more runs without tracing.
+    """
+    names = extractor_names(options)
+    batches = []
+    costs = {}
+    for pdf_path in paths:
+        tracemalloc.start()
+        try:
+            batch = process_paths([pdf_path], options)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        seconds = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            process_paths([pdf_path], options)
+            seconds.append(time.perf_counter() - start)
+        batches.append(batch)
+        insurer = batch.row(0)[0] if len(batch) else None
+        name = names.get(insurer, UNPROCESSED)
+        documents, total, peak_mb = costs.get(name, Cost(0, 0.0, 0.0))
+        costs[name] = Cost(documents + 1, total + min(seconds, default=0.0), max(peak_mb, peak / (1024 * 1024)))
+    return RowBatch.concat(batches), costs
+
+
+def run_parallel(corpus_dir: Path, options: ExtractionOptions, workers: Optional[int] = None,
+                 root_logger_level: str = 'WARN', app_logger_level: str = 'WARN') -> pd.DataFrame:
+    """
+    db.csv of create in parallel mode on the corpus, by relative pdf path, through the scheduler, the shared batches,
+    the journal and the log queue of a real run. Copies are not looked for, every pdf of the corpus is expected.
+    """
+    # main imports this module in the golden command
+    from insurancedb.main import create_db_parallel
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        create_db_parallel(corpus_dir, Path(out_dir), root_logger_level, app_logger_level, False, options,
+                           dedup=False, workers=workers)
+        db = read_db(Path(out_dir))
+    # create leaves the logging of this process on the queue of its stopped listener
+    logging.config.dictConfig(get_log_config(root_logger_level=root_logger_level, app_logger_level=app_logger_level))
+    return relative_db(db, corpus_dir)
+
+
+def exported(batch: RowBatch, corpus_dir: Path, options: ExtractionOptions) -> pd.DataFrame:
+    """db.csv of the rows, every value a string, by pdf path relative to the corpus dir, without NR.CRT."""
+    with tempfile.TemporaryDirectory() as out_dir:
+        to_csv(batch, Path(out_dir), options.fields)
+        db = read_db(Path(out_dir))
+    return relative_db(db, corpus_dir)
+
+
+def relative_db(db: pd.DataFrame, corpus_dir: Path) -> pd.DataFrame:
+    # the corpus is checked wherever it is, Unprocessed rows have the path in ASIGURATOR too
+    return by_pdf(db.apply(lambda column: column.str.replace(f"{corpus_dir}/", "", regex=False)))
+
+
+def by_pdf(db: pd.DataFrame) -> pd.DataFrame:
+    """
+    The rows of a db by relative pdf path. An Unprocessed row has only the file name in POLITA PDF, its path is taken
+    from ASIGURATOR, so pdfs of the same name in two folders are told apart.
+    """
+    unprocessed = db["ASIGURATOR"].str.startswith(f"{UNPROCESSED} ")
+    pdfs = db["POLITA PDF"].where(~unprocessed, db["ASIGURATOR"].str[len(UNPROCESSED) + 1:])
+    duplicated = sorted(set(pdfs[pdfs.duplicated()]))
+    if duplicated:
+        raise ValueError(f"More than one row of the pdfs {', '.join(duplicated)}.")
+    return db.set_index(pdfs.rename("PDF")).sort_index()
+
+
+def compare(expected: pd.DataFrame, actual: pd.DataFrame, mode: str) -> List[Mismatch]:
+    """Field by field differences of two exported dbs, a missing pdf or column is a difference of every field."""
+    mismatches = []
+    for pdf in expected.index.union(actual.index):
+        for column in expected.columns.union(actual.columns):
+            want = expected.at[pdf, column] if pdf in expected.index and column in expected.columns else None
+            got = actual.at[pdf, column] if pdf in actual.index and column in actual.columns else None
+            if want != got:
+                mismatches.append(Mismatch(mode, pdf, column, want, got))
+    return mismatches
+
+
+def over_budget(budgets: Dict[str, Cost], costs: Dict[str, Cost], tolerance: float) -> List[OverBudget]:
+    """Extractors slower or larger than their budget by more than the tolerance."""
+    exceeded = []
+    for name, cost in costs.items():
+        budget = budgets.get(name)
+        if budget is None:
+            continue
+        if cost.seconds > budget.seconds * (1 + tolerance) + SLACK_SECONDS:
+            exceeded.append(OverBudget(name, 'seconds', budget.seconds, cost.seconds))
+        if cost.peak_mb > budget.peak_mb * (1 + tolerance) + SLACK_MB:
+            exceeded.append(OverBudget(name, 'peak_mb', budget.peak_mb, cost.peak_mb))
+    return exceeded
+
+
+def record_corpus(corpus_dir: Path, options: ExtractionOptions, repeat: int = 3):
+    """Writes the expected rows and the budgets of the corpus from a serial run, check_corpus compares to them."""
+    batch, costs = run_serial(corpus_paths(corpus_dir), options, repeat)
+    db = exported(batch, corpus_dir, options)
+    db.to_csv(str(corpus_dir / EXPECTED_FILE), index=False, encoding='utf-8')
+    budgets = {'tesseract': tesseract_version(), 'options': dataclasses.asdict(options),
+               'extractors': {name: Cost(cost.documents, round(cost.seconds, 4), round(cost.peak_mb, 2))._asdict()
+                              for name, cost in sorted(costs.items())}}
+    (corpus_dir / BUDGETS_FILE).write_text(json.dumps(budgets, indent=2), encoding='utf-8')
+    logger.info("Recorded %d pdfs of %d extractors.", len(db), len(costs))
+
+
+def load_budgets(corpus_dir: Path, options: ExtractionOptions) -> Dict[str, Cost]:
+    budgets = json.loads((corpus_dir / BUDGETS_FILE).read_text(encoding='utf-8'))
+    if budgets['tesseract'] != tesseract_version():
+        logger.warning("Budgets recorded with tesseract %s, running %s.", budgets['tesseract'], tesseract_version())
+    # the options are stored as json, a tuple comes back as a list
+    if json.loads(json.dumps(dataclasses.asdict(options))) != budgets['options']:
+        logger.warning("Budgets recorded with other extraction options.")
+    return {name: Cost(**cost) for name, cost in budgets['extractors'].items()}
+
+
+def check_corpus(corpus_dir: Path, options: ExtractionOptions, repeat: int = 3, tolerance: float = 0.2,
+                 workers: Optional[int] = None, root_logger_level: str = 'WARN', app_logger_level: str = 'WARN') \
+        -> Tuple[List[Mismatch], List[OverBudget], Dict[str, Cost]]:
+    """
+    Runs the corpus in serial and parallel mode. Returns the fields that differ from the expected rows, the extractors
+    over budget and the cost of every extractor.
+    """
+    expected = by_pdf(pd.read_csv(str(corpus_dir / EXPECTED_FILE), dtype=str, keep_default_na=False,
+                                  encoding='utf-8'))
+    budgets = load_budgets(corpus_dir, options)
+    batch, costs = run_serial(corpus_paths(corpus_dir), options, repeat)
+    mismatches = compare(expected, exported(batch, corpus_dir, options), 'serial')
+    mismatches += compare(expected, run_parallel(corpus_dir, options, workers, root_logger_level, app_logger_level),
+                          'parallel')
+    for name in sorted(set(extractor_names(options).values()) - set(costs)):
+        logger.warning("No pdf of the corpus is extracted by %s.", name)
+    for name in sorted(set(costs) - set(budgets)):
+        logger.warning("No budget recorded for %s.", name)
+    return mismatches, over_budget(budgets, costs, tolerance), costs
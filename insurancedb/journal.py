@@ -0,0 +1,77 @@
+import datetime
+import json
+import logging
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_DIR_NAME = '.insurancedb-journal'
+
+
+def _to_json(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not json serializable")
+
+
+def _respelled(row: List, given: str, path: str) -> List:
+    """The row with the pdf path spelled as given replaced by path, in the pdf column and an Unprocessed insurer."""
+    if given == path:
+        return row
+    return [value.replace(given, path, 1) if isinstance(value, str) else value for value in row]
+
+
+class Journal:
+    """
+    Write-ahead journal of the processed files, kept in out_dir. Every process appends to its own json lines file,
+    one line per file as soon as it is processed, so an interrupted run can be resumed without redoing that work. A
+    file has one row, or one per policy of a batch pdf. Files are journaled by their path relative to pdfs_dir, a run
+    resumed with pdfs_dir spelled another way, relative or absolute, finds them and their rows get the path the way
+    this run spells it.
+    """
+
+    def __init__(self, out_dir: Path, pdfs_dir: Path):
+        self.dir = out_dir / JOURNAL_DIR_NAME
+        self.pdfs_dir = pdfs_dir
+        self._file = None
+        self._pid = None
+
+    def __getstate__(self):
+        # the open file stays in the process that opened it
+        return {'dir': self.dir, 'pdfs_dir': self.pdfs_dir, '_file': None, '_pid': None}
+
+    def _relative(self, pdf_path: Path) -> str:
+        # abspath, unlike resolve, keeps a symlinked pdf under pdfs_dir
+        return Path(os.path.abspath(pdf_path)).relative_to(os.path.abspath(self.pdfs_dir)).as_posix()
+
+    def record(self, pdf_path: Path, rows: List[List]):
+        if self._pid != os.getpid():
+            self.dir.mkdir(exist_ok=True)
+            self._file = open(self.dir / f'{os.getpid()}.jsonl', 'a', encoding='utf-8')
+            self._pid = os.getpid()
+        # given, the path in the rows
+        entry = {'path': self._relative(pdf_path), 'given': str(pdf_path), 'rows': rows}
+        self._file.write(json.dumps(entry, default=_to_json, ensure_ascii=False) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def load(self) -> Dict[str, List[List]]:
+        """Rows by pdf path under pdfs_dir as given to this run, a line cut short by the interruption is skipped."""
+        rows = {}
+        for journal_file in sorted(self.dir.glob('*.jsonl')):
+            with open(journal_file, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        logger.warning("Skipping incomplete journal line in %s.", journal_file)
+                        continue
+                    path = str(self.pdfs_dir / entry['path'])
+                    rows[path] = [_respelled(row, entry['given'], path) for row in entry['rows']]
+        return rows
+
+    def clear(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
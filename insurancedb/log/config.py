@@ -8,41 +8,33 @@ from typing import Any, Dict
 log_config_registry_map: Dict[str, Any] = {}
 
 
+# file extension and formatter of the log files of each log_format, the console is always detailed text
+LOG_FILE_FORMATS = {'text': ('log', 'detailed'), 'jsonl': ('jsonl', 'jsonl')}
+
+
 def get_log_config(disable_existing_loggers=False, root_logger_level='WARN', app_logger_level='INFO',
-                   log_dir: Path = Path('.'), to_file=False):
-    if to_file is True:
-        active_handlers = ['console', 'file', 'errors']
-        handlers = {
-            'handlers': {
-                'console': {
-                    'class': 'logging.StreamHandler',
-                    'formatter': 'detailed'
-                },
-                'file': {
-                    'class': 'logging.FileHandler',
-                    'filename': str(log_dir / 'insurancedb.log'),
-                    'mode': 'w',
-                    'formatter': 'detailed'
-                },
-                'errors': {
-                    'class': 'logging.FileHandler',
-                    'filename': str(log_dir / 'insurancedb-errors.log'),
-                    'mode': 'w',
-                    'formatter': 'detailed',
-                    'level': 'ERROR'
-                }
-            }
+                   log_dir: Path = Path('.'), to_file=False, log_format='text'):
+    """log_format is the format of the log files, it needs to_file."""
+    if log_format != 'text' and to_file is not True:
+        raise ValueError(f"log_format {log_format} is the format of the log files, it needs to_file")
+    handlers = {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'detailed'
         }
-    else:
-        active_handlers = ['console']
-        handlers = {
-            'handlers': {
-                'console': {
-                    'class': 'logging.StreamHandler',
-                    'formatter': 'detailed'
-                }
-            }
+    }
+    if to_file is True:
+        extension, formatter = LOG_FILE_FORMATS[log_format]
+        handlers['file'] = {
+            'class': 'logging.FileHandler',
+            'filename': str(log_dir / f'insurancedb.{extension}'),
+            'mode': 'w',
+            'encoding': 'utf-8',
+            'formatter': formatter
         }
+        handlers['errors'] = dict(handlers['file'], filename=str(log_dir / f'insurancedb-errors.{extension}'),
+                                  level='ERROR')
+    active_handlers = list(handlers)
 
     config = {
         'version': 1,
@@ -55,6 +47,9 @@ def get_log_config(disable_existing_loggers=False, root_logger_level='WARN', app
             'simple': {
                 'class': 'logging.Formatter',
                 'format': '%(name)-15s %(levelname)-8s %(processName)-10s %(message)s'
+            },
+            'jsonl': {
+                '()': 'insurancedb.log.handlers.JsonLinesFormatter'
             }
         },
         'loggers': {
@@ -72,20 +67,23 @@ def get_log_config(disable_existing_loggers=False, root_logger_level='WARN', app
         'root': {
             'handlers': active_handlers,
             'level': root_logger_level
-        }
+        },
+        'handlers': handlers
     }
-    config.update(handlers)
     return config
 
 
-def get_dispatch_log_config(q, disable_existing_loggers=False, root_logger_level='WARN', app_logger_level='INFO'):
+def get_dispatch_log_config(q, disable_existing_loggers=False, root_logger_level='WARN', app_logger_level='INFO',
+                            flush_interval_ms=200, batch_size=200):
     config = {
         'version': 1,
         'disable_existing_loggers': disable_existing_loggers,
         'handlers': {
             'queue': {
-                'class': 'logging.handlers.QueueHandler',
-                'queue': q
+                'class': 'insurancedb.log.handlers.BatchingQueueHandler',
+                'queue': q,
+                'flush_interval_ms': flush_interval_ms,
+                'batch_size': batch_size
             }
         },
         'loggers': {
@@ -0,0 +1,103 @@
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+import weakref
+from multiprocessing import util
+from typing import List
+
+_batching_handlers = weakref.WeakSet()
+
+
+class LogBatch:
+    """Records of one worker coalesced into a single queue item, with the worker's shipping counters."""
+
+    def __init__(self, pid: int, records: List[logging.LogRecord], dropped: int, blocked_seconds: float):
+        self.pid = pid
+        self.records = records
+        self.dropped = dropped
+        self.blocked_seconds = blocked_seconds
+
+
+class BatchingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that ships records in batches, one pickle and one queue put per flush_interval_ms or batch_size
+    records instead of one per record.
+
+    The queue should be bounded, a put waits at most put_timeout seconds and the batch is dropped (and counted) when
+    the listener can not keep up, so the workers are slowed down instead of the queue growing without limit.
+    """
+
+    def __init__(self, queue, flush_interval_ms=200, batch_size=200, put_timeout=5.0):
+        super().__init__(queue)
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_size = batch_size
+        self.put_timeout = put_timeout
+        self.buffer = []
+        self.dropped = 0
+        self.blocked_seconds = 0.0
+        self._buffer_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        # handlers are configured per process, a copy inherited through fork is never flushed by the child
+        self._owner_pid = os.getpid()
+        self._flusher = None
+        _batching_handlers.add(self)
+        # pool workers exit without running atexit hooks, multiprocessing finalizers do run
+        util.Finalize(self, self.flush, exitpriority=10)
+
+    def emit(self, record):
+        try:
+            # formats the message here, once, so that args do not have to be pickled
+            record = self.prepare(record)
+            with self._buffer_lock:
+                self._ensure_flusher()
+                self.buffer.append(record)
+                is_full = len(self.buffer) >= self.batch_size
+            if is_full:
+                self.flush()
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        if os.getpid() != self._owner_pid:
+            return
+        with self._flush_lock:
+            with self._buffer_lock:
+                records, self.buffer = self.buffer, []
+            if not records and not self.dropped:
+                return
+            batch = LogBatch(os.getpid(), records, self.dropped, self.blocked_seconds)
+            start = time.perf_counter()
+            try:
+                self.queue.put(batch, timeout=self.put_timeout)
+                self.dropped = 0
+            except queue.Full:
+                self.dropped += len(records)
+            self.blocked_seconds += time.perf_counter() - start
+
+    def _ensure_flusher(self):
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_periodically, name='log-flusher', daemon=True)
+            self._flusher.start()
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+
+def flush_batching_handlers():
+    for handler in list(_batching_handlers):
+        handler.flush()
+
+
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {"time": self.formatTime(record), "name": record.name, "level": record.levelname,
+                 "process": record.processName, "message": record.getMessage()}
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
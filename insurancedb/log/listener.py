@@ -2,6 +2,10 @@ import logging
 import logging.config
 import logging.handlers
 
+from insurancedb.log.handlers import LogBatch
+
+logger = logging.getLogger(__name__)
+
 
 class MyHandler:
     """
@@ -9,9 +13,24 @@ class MyHandler:
     dispatches events to loggers based on the name in the received record,
     which then get dispatched, by the logging system, to the handlers
     configured for those loggers.
+
+    Batches shipped by BatchingQueueHandler are unpacked here and their
+    backpressure counters are kept per worker.
     """
 
+    def __init__(self, q=None):
+        self.q = q
+        self.records = 0
+        self.batches = 0
+        self.max_queue_depth = 0
+        self.dropped = {}
+        self.blocked_seconds = {}
+
     def handle(self, record):
+        if isinstance(record, LogBatch):
+            self._handle_batch(record)
+            return
+        self.records += 1
         if record.name == "root":
             logger = logging.getLogger()
         else:
@@ -20,6 +39,29 @@ class MyHandler:
         if logger.isEnabledFor(record.levelno):
             logger.handle(record)
 
+    def _handle_batch(self, batch: LogBatch):
+        self.batches += 1
+        self.dropped[batch.pid] = self.dropped.get(batch.pid, 0) + batch.dropped
+        self.blocked_seconds[batch.pid] = batch.blocked_seconds
+        if batch.dropped:
+            logger.warning("Process %d dropped %d log records, the log queue was full.", batch.pid, batch.dropped)
+        self._sample_queue_depth()
+        for record in batch.records:
+            self.handle(record)
+
+    def _sample_queue_depth(self):
+        if self.q is None:
+            return
+        try:
+            self.max_queue_depth = max(self.max_queue_depth, self.q.qsize())
+        except NotImplementedError:  # macOS
+            self.q = None
+
+    def log_metrics(self):
+        logger.info("Log shipping: %d records in %d batches, max queue depth %d, dropped %d, "
+                    "workers blocked on the queue for %.2fs.", self.records, self.batches, self.max_queue_depth,
+                    sum(self.dropped.values()), sum(self.blocked_seconds.values()))
+
 
 def listener_process(q, stop_event, config):
     """
@@ -28,7 +70,9 @@ def listener_process(q, stop_event, config):
     via the event. The listener is then stopped, and the process exits.
     """
     logging.config.dictConfig(config)
-    listener = logging.handlers.QueueListener(q, MyHandler())
+    handler = MyHandler(q)
+    listener = logging.handlers.QueueListener(q, handler)
     listener.start()
     stop_event.wait()
     listener.stop()
+    handler.log_metrics()
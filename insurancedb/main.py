@@ -1,48 +1,121 @@
+import functools
+import json
 import logging
 import logging.config
 import logging.config
 import logging.handlers
 import pathlib
+import random
 from multiprocessing import Pool, Queue, Event, Process, cpu_count
 from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
 import click
+import pandas as pd
 
 logger = logging.getLogger(__name__)
 
-from insurancedb.file_processor import process_paths
-from insurancedb.exporters.file_exporter import to_csv
+from insurancedb.file_processor import process_paths, process_paths_shared
+from insurancedb.extractors.options import ExtractionOptions, PROFILES, FIELDS, profile_options, select_fields
+from insurancedb.extractors.registry import extractor_specs, insurer_names
+from insurancedb.exporters.file_exporter import to_csv, duplicates_to_csv
+from insurancedb.fingerprint import fingerprint_paths, find_duplicates, attach_copies, Duplicates
+from insurancedb.journal import Journal
 from insurancedb.log.config import get_log_config, worker_log_initializer, get_dispatch_log_config
+from insurancedb.log.handlers import flush_batching_handlers
 from insurancedb.log.listener import listener_process
-from insurancedb.utils import chunk_even_groups
+from insurancedb.plate_index import PlateIndex
+from insurancedb.row_batch import RowBatch
+from insurancedb.scheduler import PriorityScheduler, PRIORITY_URGENT, URGENT_DIR_NAME, is_urgent_path, \
+    priority_order
+from insurancedb.shared_batch import prepare_parent, receive_batch
+from insurancedb.utils import chunk_even_groups, pool_size, DefaultCommandGroup
 
 
-def create_db_serial(pdfs_dir: Path, out_dir: Path, root_logger_level: str, app_logger_level: str, log_to_file: bool):
+def get_paths_to_process(paths, journal: Journal, resume: bool):
+    """Pdfs still to process and the rows, by path, of the ones already in the journal."""
+    if not resume:
+        journal.clear()
+        return paths, {}
+    journaled = journal.load()
+    logger.info('Resuming, %d files are already in the journal.', len(journaled))
+    return [p for p in paths if str(p) not in journaled], journaled
+
+
+def get_urgent_paths(paths, pdfs_dir: Path, urgent: Iterable[Path]) -> Set[Path]:
+    """Paths in the urgent subfolder of pdfs_dir or given with --urgent, relative or absolute."""
+    urgent = {p.resolve() for p in urgent}
+    for path in sorted(urgent):
+        if pdfs_dir.resolve() not in path.parents:
+            logger.warning('--urgent %s is not in %s, it is not processed.', path, pdfs_dir)
+    return {p for p in paths if (urgent and p.resolve() in urgent) or is_urgent_path(p, pdfs_dir)}
+
+
+def remove_copies(paths, duplicates: Duplicates):
+    copy_paths = {p for copies in duplicates.copies.values() for p in copies}
+    logger.info('%d files are byte copies of other files and are not processed again, %d near duplicates.',
+                len(copy_paths), len(duplicates.near))
+    return [p for p in paths if p not in copy_paths]
+
+
+def export(journaled: Dict[str, List[List]], paths: List[Path], batches: List[RowBatch], duplicates: Duplicates,
+           out_dir: Path, fields: Optional[Tuple[str, ...]] = None):
+    """Exports the journaled rows followed by the batches of rows of paths, in the order of paths."""
+    journaled_batch = RowBatch.from_rows([row for rows in journaled.values() for row in rows],
+                                         [len(rows) for rows in journaled.values()])
+    batch = RowBatch.concat([journaled_batch] + batches)
+    if duplicates is not None:
+        attach_copies(batch, list(journaled) + [str(p) for p in paths], duplicates.copies)
+        duplicates_to_csv(duplicates, out_dir)
+    to_csv(batch, out_dir, fields)
+
+
+# command line options that are ExtractionOptions fields
+EXTRACTION_OPTION_NAMES = ['resolution', 'adaptive_ocr', 'low_resolution', 'min_confidence', 'text_layer', 'insurers',
+                           'page_memory_mb', 'mmap_input', 'ocr_jobs', 'fields', 'split_batches']
+
+# log batches the workers may queue before they have to wait for the listener
+LOG_QUEUE_SIZE = 1000
+
+
+def create_db_serial(pdfs_dir: Path, out_dir: Path, root_logger_level: str, app_logger_level: str, log_to_file: bool,
+                     options: ExtractionOptions = None, log_format: str = 'text', resume: bool = False,
+                     dedup: bool = True, urgent: Iterable[Path] = ()):
     if out_dir is None:
         out_dir = pdfs_dir
 
     logging.config.dictConfig(get_log_config(root_logger_level=root_logger_level, app_logger_level=app_logger_level,
-                                             log_dir=out_dir, to_file=log_to_file))
+                                             log_dir=out_dir, to_file=log_to_file, log_format=log_format))
     logger.info('Creating db in serial mode.')
 
     paths = list(pdfs_dir.rglob("*.pdf"))
-    data = process_paths(paths)
+    duplicates = None
+    if dedup:
+        duplicates = find_duplicates(fingerprint_paths(paths))
+        paths = remove_copies(paths, duplicates)
+
+    journal = Journal(out_dir, pdfs_dir)
+    paths, journaled = get_paths_to_process(paths, journal, resume)
+    paths = priority_order(paths, get_urgent_paths(paths, pdfs_dir, urgent))
+    batch = process_paths(paths, options, journal)
 
-    to_csv(data, out_dir)
+    export(journaled, paths, [batch], duplicates, out_dir, options.fields if options is not None else None)
 
 
 def create_db_parallel(pdfs_dir: Path, out_dir: Path, root_logger_level: str, app_logger_level: str,
-                       log_to_file: bool):
+                       log_to_file: bool, options: ExtractionOptions = None, log_format: str = 'text',
+                       log_flush_ms: int = 200, resume: bool = False, dedup: bool = True, urgent: Iterable[Path] = (),
+                       chunk_size: int = 8, workers: Optional[int] = None):
     if out_dir is None:
         out_dir = pdfs_dir
 
-    q = Queue()
+    q = Queue(LOG_QUEUE_SIZE)
     worker_log_config = get_dispatch_log_config(q, root_logger_level=root_logger_level,
-                                                app_logger_level=app_logger_level)
+                                                app_logger_level=app_logger_level, flush_interval_ms=log_flush_ms)
     worker_log_initializer(worker_log_config)
 
     listener_log_config = get_log_config(root_logger_level=root_logger_level, app_logger_level=app_logger_level,
-                                         log_dir=out_dir, to_file=log_to_file)
+                                         log_dir=out_dir, to_file=log_to_file, log_format=log_format)
     stop_event = Event()
     lp = Process(target=listener_process, name='listener',
                  args=(q, stop_event, listener_log_config))
@@ -51,35 +124,289 @@ def create_db_parallel(pdfs_dir: Path, out_dir: Path, root_logger_level: str, ap
     # ----------------------------------------------------
     logger.info('Creating db in multiprocessing mode.')
 
-    paths = list(pdfs_dir.rglob("*.pdf"))
-    paths_chunked = list(chunk_even_groups(paths, cpu_count()))
+    all_paths = list(pdfs_dir.rglob("*.pdf"))
+    paths = all_paths
+    journal = Journal(out_dir, pdfs_dir)
+    duplicates = None
+
+    workers = workers or pool_size((options or ExtractionOptions()).page_memory_mb)
+    logger.info('Using %d workers.', workers)
+    prepare_parent()
+    with Pool(workers, initializer=worker_log_initializer, initargs=(worker_log_config,)) as pool:
+        if dedup:
+            fingerprints = pool.map(fingerprint_paths, chunk_even_groups(paths, workers))
+            duplicates = find_duplicates([fp for sublist in fingerprints for fp in sublist])
+            paths = remove_copies(paths, duplicates)
 
-    with Pool(cpu_count(), initializer=worker_log_initializer, initargs=(worker_log_config,)) as pool:
-        data_parallel = pool.map(process_paths, paths_chunked)
-        data = [item for sublist in data_parallel for item in sublist]
+        paths, journaled = get_paths_to_process(paths, journal, resume)
+        scheduler = PriorityScheduler(pool, functools.partial(process_paths_shared, options=options, journal=journal),
+                                      workers, chunk_size, urgent_dir=pdfs_dir / URGENT_DIR_NAME,
+                                      skip=set(all_paths) - set(paths))
+        scheduler.add(get_urgent_paths(paths, pdfs_dir, urgent), PRIORITY_URGENT)
+        scheduler.add(paths)
+        paths, shared_batches = scheduler.run()
+        batches = [receive_batch(shared) for shared in shared_batches]
+        # let the workers exit normally so they ship their last log batch
+        pool.close()
+        pool.join()
 
-    to_csv(data, out_dir)
+    export(journaled, paths, batches, duplicates, out_dir, options.fields if options is not None else None)
     logger.info('Done')
     # ----------------------------------------------------
 
+    flush_batching_handlers()
+    # wait until the last batch is in the pipe, the listener drains it before stopping
+    q.close()
+    q.join_thread()
     stop_event.set()
     lp.join()
 
 
-@click.command()
+def parse_insurers(ctx, param, value):
+    if value is None:
+        return None
+    insurers = tuple(name.strip().lower() for name in value.split(',') if name.strip())
+    unknown = set(insurers) - set(insurer_names())
+    if unknown:
+        raise click.BadParameter(f"unknown insurers {', '.join(sorted(unknown))}, known: {', '.join(insurer_names())}")
+    return insurers
+
+
+def parse_fields(ctx, param, value):
+    if value is None:
+        return None
+    try:
+        return select_fields(name.strip() for name in value.split(',') if name.strip())
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+
+def extraction_options(command=None, *, default_profile: Optional[str] = None):
+    """
+    Adds the extraction options to a command, which gets them as a single ExtractionOptions options argument: the
+    --profile options, or the defaults, with the options given on the command line replaced.
+    """
+    if command is None:
+        return functools.partial(extraction_options, default_profile=default_profile)
+
+    @click.option('--profile', type=click.Choice(list(PROFILES)), default=default_profile,
+                  show_default=default_profile is not None,
+                  help='fast for daily runs, accurate for audits, balanced in between. Options given explicitly '
+                       'override the ones of the profile.')
+    @click.option('--resolution', type=int, default=600, show_default=True, help='Render resolution of OCR pages.')
+    @click.option('--adaptive_ocr', type=bool, default=False, show_default=True,
+                  help='OCR at --low_resolution first, re-read only low confidence fields at full resolution.')
+    @click.option('--low_resolution', type=int, default=300, show_default=True)
+    @click.option('--min_confidence', type=float, default=70.0, show_default=True)
+    @click.option('--text_layer', type=bool, default=False, show_default=True,
+                  help='OCR extractors read fields from the pdf text layer first, OCR only what is missing or '
+                       'unparsable.')
+    @click.option('--insurers', default=None, callback=parse_insurers,
+                  help='Comma separated insurers whose extractors are tried, e.g. allianz,grawe, all by default.')
+    @click.option('--page_memory_mb', type=int, default=512, show_default=True,
+                  help='Page renders a worker keeps in memory, older ones are spilled to temporary files. The '
+                       'parallel mode starts fewer workers than cpus when the available memory does not fit them.')
+    @click.option('--mmap_input', type=bool, default=False, show_default=True,
+                  help='Open pdfs through a memory map, large scanned bundles are read from the OS page cache '
+                       'instead of being copied into every worker.')
+    @click.option('--ocr_jobs', type=int, default=1, show_default=True,
+                  help='Documents a worker processes at the same time in threads, one is rendered while tesseract '
+                       'reads another.')
+    @click.option('--fields', default=None, callback=parse_fields,
+                  help=f"Comma separated fields to extract and export, e.g. car_number,expiration_date, all by "
+                       f"default. OCR crops of the other fields are skipped. Fields: {', '.join(FIELDS)}.")
+    @click.option('--split_batches', type=bool, default=False, show_default=True,
+                  help='A pdf may hold several policies one after the other, each gets a row. The policies of a pdf '
+                       'are extracted --ocr_jobs at a time.')
+    @functools.wraps(command)
+    def wrapper(*args, profile: str, **kwargs):
+        ctx = click.get_current_context()
+        overrides = {name: kwargs.pop(name) for name in EXTRACTION_OPTION_NAMES}
+        overrides = {name: value for name, value in overrides.items()
+                     if ctx.get_parameter_source(name) != click.core.ParameterSource.DEFAULT}
+        return command(*args, options=profile_options(profile, **overrides), **kwargs)
+
+    return wrapper
+
+
+@click.group(cls=DefaultCommandGroup, default_command='create')
+def cli():
+    pass
+
+
+@cli.command('create')
 @click.argument('pdfs_dir', type=click.Path(path_type=pathlib.Path, exists=True), required=True)
 @click.option('--out_dir', type=click.Path(path_type=pathlib.Path, exists=True), required=False)
 @click.option('--parallel', type=bool, default=True, show_default=True)
 @click.option('--root_logger_level', default='WARN', show_default=True)
 @click.option('--app_logger_level', default='INFO', show_default=True)
 @click.option('--log_to_file', default=False, show_default=True)
+@click.option('--log_format', type=click.Choice(['text', 'jsonl']), default='text', show_default=True,
+              help='Format of the log files, jsonl writes one json object per line. Needs --log_to_file, the '
+                   'console log is text.')
+@click.option('--log_flush_ms', type=int, default=200, show_default=True,
+              help='Workers ship their log records to the listener in batches at most this often.')
+@click.option('--resume', type=bool, default=False, show_default=True,
+              help='Skip the pdfs already in the journal of out_dir, from an interrupted run.')
+@click.option('--dedup', type=bool, default=True, show_default=True,
+              help='Process byte identical pdfs once and report near duplicates in duplicates.csv.')
+@click.option('--urgent', type=click.Path(path_type=pathlib.Path, exists=True, dir_okay=False), multiple=True,
+              help='Pdf of pdfs_dir to process before the others, pdfs in the urgent subfolder of pdfs_dir are too, '
+                   'also the ones dropped there during a parallel run.')
+@click.option('--chunk_size', type=int, default=8, show_default=True,
+              help='Pdfs sent to a worker at a time, smaller chunks serve urgent pdfs sooner.')
+@extraction_options
 def create_db(pdfs_dir: Path, out_dir: Path, parallel: bool, root_logger_level: str, app_logger_level: str,
-              log_to_file: bool):
+              log_to_file: bool, log_format: str, log_flush_ms: int, resume: bool, dedup: bool, urgent: Tuple[Path],
+              chunk_size: int, options: ExtractionOptions):
+    if log_format != 'text' and not log_to_file:
+        raise click.UsageError(f"--log_format {log_format} needs --log_to_file true, the console log is text.")
     if parallel:
-        create_db_parallel(pdfs_dir, out_dir, root_logger_level, app_logger_level, log_to_file)
+        create_db_parallel(pdfs_dir, out_dir, root_logger_level, app_logger_level, log_to_file, options, log_format,
+                           log_flush_ms, resume=resume, dedup=dedup, urgent=urgent, chunk_size=chunk_size)
     else:
-        create_db_serial(pdfs_dir, out_dir, root_logger_level, app_logger_level, log_to_file)
+        create_db_serial(pdfs_dir, out_dir, root_logger_level, app_logger_level, log_to_file, options, log_format,
+                         resume=resume, dedup=dedup, urgent=urgent)
+
+
+@cli.command('serve')
+@click.option('--host', default='127.0.0.1', show_default=True)
+@click.option('--port', type=int, default=8765, show_default=True)
+@click.option('--workers', type=int, default=cpu_count(), show_default=True)
+@click.option('--batch_size', type=int, default=16, show_default=True,
+              help='Most documents of concurrent requests sent to the workers together.')
+@click.option('--batch_wait_ms', type=int, default=20, show_default=True,
+              help='How long the first queued document waits for others to join its batch.')
+@click.option('--root_logger_level', default='WARN', show_default=True)
+@click.option('--app_logger_level', default='INFO', show_default=True)
+@extraction_options
+def serve_command(host: str, port: int, workers: int, batch_size: int, batch_wait_ms: int, root_logger_level: str,
+                  app_logger_level: str, options: ExtractionOptions):
+    """
+    HTTP extraction service with a warm worker pool: POST the pdf bytes to /extract?file_name=<name>, queue depth and
+    latencies are at /metrics.
+    """
+    # imported by the commands that use them, the workers forked by create do not load the api and ocr modules
+    from insurancedb.service import serve
+
+    logging.config.dictConfig(get_log_config(root_logger_level=root_logger_level, app_logger_level=app_logger_level))
+    serve(host, port, workers, batch_size, batch_wait_ms, options)
+
+
+@cli.command('extractors')
+def list_extractors():
+    """The built in and plugin extractors, without importing them."""
+    for spec in extractor_specs():
+        click.echo(f"{spec.name:<10} {spec.cost_class:<5} pages {','.join(map(str, spec.pages)):<6} "
+                   f"{'|'.join(spec.file_name_hints) or '*':<20} {spec.target}")
+
+
+@cli.command('reprocess')
+@click.argument('out_dir', type=click.Path(path_type=pathlib.Path, exists=True), required=True)
+@click.option('--low_confidence', type=float, default=70.0, show_default=True,
+              help='OCR fields below this confidence, or not matching their pattern, are read again.')
+@click.option('--root_logger_level', default='WARN', show_default=True)
+@click.option('--app_logger_level', default='INFO', show_default=True)
+@extraction_options(default_profile='accurate')
+def reprocess_command(out_dir: Path, low_confidence: float, root_logger_level: str, app_logger_level: str,
+                      options: ExtractionOptions):
+    """
+    Reads the low confidence OCR fields of the db in OUT_DIR again with other options, only those fields of only
+    the affected pdfs, and updates their rows in place.
+    """
+    from insurancedb.reprocess import reprocess
+
+    logging.config.dictConfig(get_log_config(root_logger_level=root_logger_level, app_logger_level=app_logger_level))
+    updated = reprocess(out_dir, low_confidence, options)
+    logger.info("%d rows updated.", updated)
+
+
+@cli.command('profile')
+@click.argument('pdfs_dir', type=click.Path(path_type=pathlib.Path, exists=True), required=True)
+@click.option('--sample', type=int, default=50, show_default=True,
+              help='Pdfs picked at random from pdfs_dir, all of them when 0.')
+@click.option('--seed', type=int, default=0, show_default=True)
+@click.option('--top', type=int, default=20, show_default=True, help='Slowest documents shown.')
+@click.option('--stacks', type=click.Path(path_type=pathlib.Path, dir_okay=False), default='profile.folded',
+              show_default=True, help='Folded stacks for flamegraph.pl or speedscope.')
+@click.option('--interval_ms', type=float, default=5.0, show_default=True, help='Stack sampling interval.')
+@extraction_options
+def profile_command(pdfs_dir: Path, sample: int, seed: int, top: int, stacks: Path, interval_ms: float,
+                    options: ExtractionOptions):
+    """
+    Time and peak traced memory of a sample of PDFS_DIR by document, extractor class and extractor_methods helper,
+    slowest first.
+    """
+    from insurancedb.profiler import profile_paths
+
+    paths = sorted(pdfs_dir.rglob("*.pdf"))
+    if 0 < sample < len(paths):
+        paths = sorted(random.Random(seed).sample(paths, sample))
+    documents, groups, folded = profile_paths(paths, options, interval_ms / 1000)
+    stacks.write_text(folded, encoding='utf-8')
+    with pd.option_context('display.max_rows', None, 'display.max_colwidth', 80, 'display.width', 200):
+        click.echo(documents.head(top).to_string())
+        click.echo()
+        click.echo(groups.to_string())
+    click.echo(f"\nFolded stacks written to {stacks}.")
+
+
+@cli.command('golden')
+@click.argument('corpus_dir', type=click.Path(path_type=pathlib.Path, exists=True), required=True)
+@click.option('--record', is_flag=True, default=False,
+              help='Write the expected rows and the budgets of the corpus from this run instead of checking it.')
+@click.option('--repeat', type=int, default=3, show_default=True, help='Timed runs of every pdf, the best one counts.')
+@click.option('--tolerance', type=float, default=0.2, show_default=True,
+              help='An extractor fails when it is this much slower, or takes this much more memory, than its budget.')
+@click.option('--workers', type=int, default=None, help='Workers of the parallel run, by available memory by default.')
+@click.option('--root_logger_level', default='WARN', show_default=True)
+@click.option('--app_logger_level', default='WARN', show_default=True)
+@extraction_options
+def golden_command(corpus_dir: Path, record: bool, repeat: int, tolerance: float, workers: Optional[int],
+                   root_logger_level: str, app_logger_level: str, options: ExtractionOptions):
+    """
+    Checks the pdfs of CORPUS_DIR against the expected.csv and budgets.json written there by --record: every field in
+    serial and parallel mode, the seconds and peak memory of every extractor. Exits with 1 on a difference or an
+    extractor over budget. Runs offline, OCR with the local tesseract.
+    """
+    from insurancedb.golden import check_corpus, record_corpus
+
+    logging.config.dictConfig(get_log_config(root_logger_level=root_logger_level, app_logger_level=app_logger_level))
+    if record:
+        record_corpus(corpus_dir, options, repeat)
+        return
+    mismatches, exceeded, costs = check_corpus(corpus_dir, options, repeat, tolerance, workers, root_logger_level,
+                                               app_logger_level)
+    with pd.option_context('display.max_rows', None, 'display.max_colwidth', 80, 'display.width', 200):
+        click.echo(pd.DataFrame([[name, *cost] for name, cost in sorted(costs.items())],
+                                columns=["EXTRACTOR", "DOCUMENTS", "SECONDS", "PEAK MB"]).round(3).to_string())
+        if mismatches:
+            click.echo(f"\n{len(mismatches)} fields differ from {corpus_dir / 'expected.csv'}:")
+            click.echo(pd.DataFrame(mismatches, columns=["MODE", "PDF", "COLUMN", "EXPECTED", "ACTUAL"])
+                       .to_string())
+        if exceeded:
+            click.echo(f"\n{len(exceeded)} budgets exceeded by more than {tolerance:.0%}:")
+            click.echo(pd.DataFrame(exceeded, columns=["EXTRACTOR", "MEASURE", "BUDGET", "ACTUAL"]).round(3)
+                       .to_string())
+    if mismatches or exceeded:
+        raise SystemExit(1)
+    click.echo("\nAll fields match, all extractors within budget.")
+
+
+@cli.command('plate')
+@click.argument('db_dir', type=click.Path(path_type=pathlib.Path, exists=True), required=True)
+@click.argument('car_number', required=True)
+@click.option('--all', 'all_policies', is_flag=True, default=False, help='All policies of the car, newest first.')
+def plate(db_dir: Path, car_number: str, all_policies: bool):
+    """Latest policy of CAR_NUMBER from the plates.json index that create writes next to db.csv."""
+    index = PlateIndex.load(db_dir)
+    policies = index.policies(car_number) if all_policies else [index.latest(car_number)]
+    policies = [p for p in policies if p is not None]
+    if not policies:
+        raise click.ClickException(f"No policy for {car_number} in {db_dir}.")
+    for policy in policies:
+        click.echo(json.dumps(policy, ensure_ascii=False))
 
 
 if __name__ == '__main__':
-    create_db()
+    cli()
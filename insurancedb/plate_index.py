@@ -0,0 +1,61 @@
+import json
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+import pandas as pd
+
+from insurancedb.extractors.plates import plate_key
+
+PLATE_INDEX_FILE = 'plates.json'
+
+
+class PlateIndex:
+    """
+    Policies by normalized car number, newest expiration first, so "latest policy for plate X" is a dict lookup
+    instead of a scan of db.csv.
+    """
+
+    def __init__(self, policies: Dict[str, List[dict]]):
+        self.policies_by_plate = policies
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> 'PlateIndex':
+        """From the normalized export frame, date columns still datetime."""
+        df = df[df["NUMAR INMATRICULARE"].notna()]
+        df = df.sort_values(by=["NUMAR INMATRICULARE", "DATA EXPIRARE"], ascending=[True, False],
+                            na_position='last')
+        df = df.assign(**{column: df[column].dt.strftime('%Y-%m-%d')
+                          for column in df.columns if pd.api.types.is_datetime64_any_dtype(df[column])})
+        df = df.astype(object).where(df.notna(), None)
+        policies = {plate: group.drop(columns=["NUMAR INMATRICULARE"]).to_dict(orient='records')
+                    for plate, group in df.groupby("NUMAR INMATRICULARE", sort=False)}
+        return cls(policies)
+
+    @classmethod
+    def load(cls, db_dir: Path) -> 'PlateIndex':
+        with open(db_dir / PLATE_INDEX_FILE, encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def save(self, db_dir: Path):
+        with open(db_dir / PLATE_INDEX_FILE, 'w', encoding='utf-8') as f:
+            json.dump(self.policies_by_plate, f, ensure_ascii=False)
+
+    def replace(self, pdfs: Set[str], other: 'PlateIndex'):
+        """Drops the policies of the pdfs, by POLITA PDF, and adds the ones of other."""
+        plates = {}
+        for plate, policies in self.policies_by_plate.items():
+            kept = [p for p in policies if p["POLITA PDF"] not in pdfs]
+            if kept:
+                plates[plate] = kept
+        for plate, policies in other.policies_by_plate.items():
+            merged = plates.get(plate, []) + policies
+            # newest expiration first, the ones without an expiration date last
+            plates[plate] = sorted(merged, key=lambda p: p["DATA EXPIRARE"] or "", reverse=True)
+        self.policies_by_plate = plates
+
+    def policies(self, car_number: str) -> List[dict]:
+        return self.policies_by_plate.get(plate_key(car_number), [])
+
+    def latest(self, car_number: str) -> Optional[dict]:
+        policies = self.policies(car_number)
+        return policies[0] if policies else None
@@ -0,0 +1,157 @@
+import collections
+import cProfile
+import dataclasses
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from insurancedb.extractors import extractor_methods
+from insurancedb.extractors.options import ExtractionOptions
+from insurancedb.extractors.registry import select_specs
+from insurancedb.file_processor import process_paths
+
+KIND_EXTRACTOR = 'extractor'
+KIND_HELPER = 'helper'
+
+# code location, (file name, first line), of a function
+CodeKey = Tuple[str, int]
+
+
+def extractor_code_keys(options: ExtractionOptions) -> Dict[CodeKey, str]:
+    """Class name by code location of every method defined in the extractor classes, this imports all of them."""
+    keys = {}
+    for spec in select_specs(options.insurers):
+        cls = spec.load()
+        for attribute in vars(cls).values():
+            code = getattr(attribute, '__code__', None)
+            if code is not None:
+                keys[(code.co_filename, code.co_firstlineno)] = cls.__name__
+    return keys
+
+
+def group_of(code_key: CodeKey, function_name: str, extractor_keys: Dict[CodeKey, str]) -> Optional[Tuple[str, str]]:
+    """(kind, name) of the extractor class or extractor_methods helper the function is, None for other code."""
+    if code_key in extractor_keys:
+        return KIND_EXTRACTOR, extractor_keys[code_key]
+    if code_key[0] == extractor_methods.__file__:
+        return KIND_HELPER, function_name
+    return None
+
+
+def frame_name(frame, group: Optional[Tuple[str, str]]) -> str:
+    """module:function of a stack frame, module:Class.method for the methods of the extractor classes."""
+    name = frame.f_code.co_name
+    if group is not None and group[0] == KIND_EXTRACTOR:
+        name = f"{group[1]}.{name}"
+    return f"{frame.f_globals.get('__name__', '?')}:{name}"
+
+
+class StackSampler(threading.Thread):
+    """
+    Samples the stack of a thread every interval seconds: folded stacks, the flamegraph.pl input format, and the
+    largest traced memory seen while each extractor class or helper was on the stack.
+    """
+
+    def __init__(self, thread_id: int, interval: float, extractor_keys: Dict[CodeKey, str]):
+        super().__init__(name='stack-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.extractor_keys = extractor_keys
+        self.stacks = collections.Counter()
+        self.peak_traced: Dict[Tuple[str, str], int] = collections.defaultdict(int)
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            traced = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                group = group_of((code.co_filename, code.co_firstlineno), code.co_name, self.extractor_keys)
+                if group is not None:
+                    self.peak_traced[group] = max(self.peak_traced[group], traced)
+                names.append(frame_name(frame, group))
+                if code is process_paths.__code__:
+                    break
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def group_times(stats: pstats.Stats, extractor_keys: Dict[CodeKey, str]) -> Dict[Tuple[str, str], Tuple[int, float]]:
+    """
+    Calls and cumulative seconds of every extractor class and helper. A class gets the time of the calls into its
+    methods from outside the class, so a method calling another one is not counted twice.
+    """
+    groups = collections.defaultdict(lambda: [0, 0.0])
+    for (file_name, line, name), (_, calls, _, cumulative, callers) in stats.stats.items():
+        group = group_of((file_name, line), name, extractor_keys)
+        if group is None:
+            continue
+        if group[0] == KIND_HELPER:
+            groups[group][0] += calls
+            groups[group][1] += cumulative
+            continue
+        for (caller_file, caller_line, caller_name), (edge_calls, _, _, edge_cumulative) in callers.items():
+            if group_of((caller_file, caller_line), caller_name, extractor_keys) != group:
+                groups[group][0] += edge_calls
+                groups[group][1] += edge_cumulative
+    return {group: (calls, seconds) for group, (calls, seconds) in groups.items()}
+
+
+def profile_paths(paths: List[Path], options: ExtractionOptions, interval: float = 0.005) \
+        -> Tuple[pd.DataFrame, pd.DataFrame, str]:
+    """
+    Runs process_paths on every pdf under cProfile, tracemalloc and a stack sampler, in the calling thread whatever
+    options.ocr_jobs is. Returns the documents and the extractor classes and helpers ranked by seconds, and the folded
+    stacks.
+    """
+    # cProfile and the sampler only see this thread, the policies of a batch pdf are extracted in it too
+    options = dataclasses.replace(options, ocr_jobs=1)
+    extractor_keys = extractor_code_keys(options)
+    sampler = StackSampler(threading.get_ident(), interval, extractor_keys)
+    profiler = cProfile.Profile()
+    documents = []
+    sampler.start()
+    try:
+        for pdf_path in paths:
+            # restarted per document, the traced memory and peak are of this document alone
+            tracemalloc.start()
+            start = time.perf_counter()
+            profiler.enable()
+            try:
+                row = process_paths([pdf_path], options).row(0)
+            finally:
+                profiler.disable()
+                elapsed = time.perf_counter() - start
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+            documents.append({"PDF": str(pdf_path), "ASIGURATOR": row[0], "SECONDS": round(elapsed, 3),
+                              "PEAK TRACED MB": round(peak / (1024 * 1024), 1)})
+    finally:
+        sampler.stop()
+    total = sum(d["SECONDS"] for d in documents) or 1.0
+    groups = []
+    for (kind, name), (calls, seconds) in group_times(pstats.Stats(profiler), extractor_keys).items():
+        groups.append({"NAME": name, "KIND": kind, "CALLS": calls, "SECONDS": round(seconds, 3),
+                       "SHARE": round(seconds / total, 3),
+                       "PEAK TRACED MB": round(sampler.peak_traced.get((kind, name), 0) / (1024 * 1024), 1)})
+    documents = pd.DataFrame(documents, columns=["PDF", "ASIGURATOR", "SECONDS", "PEAK TRACED MB"])
+    groups = pd.DataFrame(groups, columns=["NAME", "KIND", "CALLS", "SECONDS", "SHARE", "PEAK TRACED MB"])
+    return (documents.sort_values("SECONDS", ascending=False, ignore_index=True),
+            groups.sort_values("SECONDS", ascending=False, ignore_index=True), sampler.folded())
@@ -0,0 +1,83 @@
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from insurancedb.exporters.file_exporter import read_fields, read_db, update_csv
+from insurancedb.exporters.normalize import ROW_COLUMNS
+from insurancedb.extractors.options import ExtractionOptions
+from insurancedb.extractors.page_range import PageRange, parse_page_range_path
+from insurancedb.extractors.pdf_file import open_pdf
+from insurancedb.file_processor import extract_pdf, extractor_row
+from insurancedb.row_batch import RowBatch
+
+logger = logging.getLogger(__name__)
+
+FieldReads = Dict[str, Tuple[str, float]]
+
+# db.csv columns filled from each ocr field, a field with an empty column did not match its regex, whatever its
+# confidence
+FIELD_COLUMNS = {
+    'insurance_number_l': ["NUMAR POLITA"],
+    'start_end_l': ["DATA EMITERE", "DATA EXPIRARE", "PERIODA DE ASIGURARE"],
+    'amount_class_l': ["CLASA B/M", "VALOARE POLITA"],
+    'person_name_l': ["NUME CLIENT"],
+    'car_number_l': ["NUMAR INMATRICULARE"],
+}
+
+
+def fields_to_reprocess(out_dir: Path, min_confidence: float) -> Dict[str, Tuple[FieldReads, Set[str]]]:
+    """
+    By pdf column of db.csv, the field reads of the pdf and the fields to read again: the ones below min_confidence
+    and the ones whose columns are empty.
+    """
+    db = read_db(out_dir)
+    rows = {pdf: row for pdf, row in zip(db["POLITA PDF"], db.to_dict(orient='records'))}
+    fields = read_fields(out_dir)
+    tasks = {}
+    for pdf, group in fields.groupby("POLITA PDF", sort=False):
+        reads = {field: (text, float(confidence))
+                 for field, text, confidence in zip(group["CAMP"], group["TEXT"], group["INCREDERE"])}
+        row = rows.get(pdf)
+        weak = {field for field, (_, confidence) in reads.items()
+                if confidence < min_confidence or
+                (row is not None and any(row.get(column) == '' for column in FIELD_COLUMNS.get(field, ())))}
+        if weak:
+            tasks[pdf] = (reads, weak)
+    return tasks
+
+
+def reprocess_pdf(pdf_column: str, reads: FieldReads, weak: Set[str], options: ExtractionOptions) -> Optional[List]:
+    """The row of the pdf with only the weak fields read again, None when the pdf is gone or no longer matches."""
+    # the first path of the pdf column is the processed one, the others are its copies
+    pdf_path, pages = parse_page_range_path(pdf_column.split(" | ")[0])
+    if not pdf_path.exists():
+        logger.warning("%s no longer exists.", pdf_path)
+        return None
+    with open_pdf(pdf_path, options.mmap_input) as pdf:
+        # a policy of a batch pdf is read from its pages
+        extractor = extract_pdf(pdf_path.name, pdf if pages is None else PageRange(pdf, *pages), options,
+                                field_reads={field: read for field, read in reads.items() if field not in weak})
+        if extractor is None:
+            logger.warning("No extractor matches %s with the reprocess options.", pdf_path)
+            return None
+        row = extractor_row(extractor, pdf_path, options)
+    row[ROW_COLUMNS.index("POLITA PDF")] = pdf_column
+    return row
+
+
+def reprocess(out_dir: Path, min_confidence: float, options: ExtractionOptions) -> int:
+    """
+    Reads the weak ocr fields of the pdfs of out_dir again with options and updates their rows, the other fields and
+    pdfs are not read. Returns the number of rows updated.
+    """
+    tasks = fields_to_reprocess(out_dir, min_confidence)
+    logger.info("%d files have fields to read again.", len(tasks))
+    rows = []
+    for pdf_column, (reads, weak) in tasks.items():
+        logger.info("Reading %s of %s again.", ", ".join(sorted(weak)), pdf_column)
+        row = reprocess_pdf(pdf_column, reads, weak, options)
+        if row is not None:
+            rows.append(row)
+    if rows:
+        update_csv(RowBatch.from_rows(rows), out_dir)
+    return len(rows)
@@ -0,0 +1,75 @@
+from typing import Dict, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from insurancedb.exporters.normalize import ROW_COLUMNS, DATE_COLUMNS
+
+# few distinct values, stored as small integer codes into the list of values
+DICTIONARY_COLUMNS = ["ASIGURATOR", "TIP ASIGURARE"]
+
+Column = Union[np.ndarray, pd.Categorical]
+
+
+class RowBatch:
+    """
+    Extracted rows of one worker chunk, stored by column in ROW_COLUMNS order. Dates are datetime64[D] arrays and
+    the DICTIONARY_COLUMNS are categoricals, so a batch pickles to a few numpy buffers plus the free text columns,
+    and the exporter frame is built from the columns without going through python rows. row_counts is the number of
+    rows of each document, in order, one or one per policy of a batch pdf.
+    """
+    __slots__ = ('columns', 'row_counts')
+
+    def __init__(self, columns: Dict[str, Column], row_counts: Optional[np.ndarray] = None):
+        self.columns = columns
+        self.row_counts = np.ones(len(self), dtype=np.int32) if row_counts is None else row_counts
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Sequence], row_counts: Optional[Sequence[int]] = None) -> 'RowBatch':
+        columns = {}
+        for i, name in enumerate(ROW_COLUMNS):
+            values = [row[i] for row in rows]
+            if name in DICTIONARY_COLUMNS:
+                # the categories of an all None column are float, they would not concatenate with the strings
+                columns[name] = pd.Categorical(values, categories=pd.Index(
+                    sorted({v for v in values if v is not None}), dtype=object))
+            elif name in DATE_COLUMNS:
+                # dates, iso strings of journaled rows and None (NaT) alike
+                columns[name] = np.array(values, dtype='datetime64[D]')
+            else:
+                columns[name] = np.array(values, dtype=object)
+        return cls(columns, None if row_counts is None else np.array(row_counts, dtype=np.int32))
+
+    @classmethod
+    def concat(cls, batches: Sequence['RowBatch']) -> 'RowBatch':
+        if not batches:
+            return cls.from_rows([])
+        columns = {}
+        for name in ROW_COLUMNS:
+            parts = [batch.columns[name] for batch in batches]
+            if name in DICTIONARY_COLUMNS:
+                columns[name] = union_categoricals(parts)
+            else:
+                columns[name] = np.concatenate(parts)
+        return cls(columns, np.concatenate([batch.row_counts for batch in batches]))
+
+    def __len__(self) -> int:
+        return len(self.columns[ROW_COLUMNS[0]])
+
+    def row(self, i: int) -> List:
+        return [_to_python(self.columns[name][i]) for name in ROW_COLUMNS]
+
+    def rows(self) -> Iterator[List]:
+        return (self.row(i) for i in range(len(self)))
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.columns, columns=ROW_COLUMNS)
+
+
+def _to_python(value):
+    if isinstance(value, np.datetime64):
+        return None if np.isnat(value) else value.astype(object)
+    if value is np.nan:
+        return None
+    return value
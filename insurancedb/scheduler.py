@@ -0,0 +1,115 @@
+import heapq
+import itertools
+import logging
+import queue
+import time
+from multiprocessing.pool import Pool
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# pdfs dropped in this subfolder of pdfs_dir, also during a run, are processed before everything else
+URGENT_DIR_NAME = 'urgent'
+PRIORITY_URGENT = 0
+PRIORITY_BULK = 1
+# how often the urgent folder is scanned while waiting for the workers
+URGENT_POLL_S = 1.0
+# a pdf dropped in the urgent folder is picked up once it was not modified for this long, it may still be copied
+SETTLE_S = 2.0
+
+
+def is_urgent_path(path: Path, pdfs_dir: Path) -> bool:
+    return URGENT_DIR_NAME in path.relative_to(pdfs_dir).parts[:-1]
+
+
+class PriorityScheduler:
+    """
+    Feeds the pool chunks of at most chunk_size pdfs, urgent pdfs first, then the newest first by modification time.
+    Only max_in_flight chunks are queued in the pool at a time, so a pdf enqueued later, e.g. dropped in the urgent
+    folder during a full archive run, waits for at most these chunks. Urgent pdfs are sent one per chunk.
+    """
+
+    def __init__(self, pool: Pool, task: Callable, workers: int, chunk_size: int = 8,
+                 urgent_dir: Optional[Path] = None, skip: Iterable[Path] = ()):
+        self.pool = pool
+        self.task = task
+        self.chunk_size = chunk_size
+        # two chunks per worker, one running and one ready to start
+        self.max_in_flight = 2 * workers
+        self.urgent_dir = urgent_dir
+        self._seen: Set[Path] = set(skip)
+        self._heap: List[Tuple[int, float, int, Path]] = []
+        self._order = itertools.count()
+        self._done = queue.Queue()
+
+    def add(self, paths: Iterable[Path], priority: int = PRIORITY_BULK):
+        for path in paths:
+            if path in self._seen:
+                continue
+            self._seen.add(path)
+            heapq.heappush(self._heap, (priority, -_mtime(path), next(self._order), path))
+
+    def run(self) -> Tuple[List[Path], list]:
+        """Paths in the order they were processed and the task results of their chunks, in the same order."""
+        paths, results = [], []
+        in_flight = 0
+        while True:
+            unsettled = self._scan_urgent_dir()
+            while self._heap and in_flight < self.max_in_flight:
+                self._dispatch(self._next_chunk())
+                in_flight += 1
+            if in_flight == 0 and not unsettled:
+                return paths, results
+            try:
+                chunk, result, error = self._done.get(timeout=URGENT_POLL_S if self.urgent_dir else None)
+            except queue.Empty:
+                continue
+            in_flight -= 1
+            if error is not None:
+                raise error
+            paths.extend(chunk)
+            results.append(result)
+
+    def _next_chunk(self) -> List[Path]:
+        priority = self._heap[0][0]
+        size = 1 if priority == PRIORITY_URGENT else self.chunk_size
+        chunk = []
+        while self._heap and len(chunk) < size and self._heap[0][0] == priority:
+            chunk.append(heapq.heappop(self._heap)[-1])
+        return chunk
+
+    def _dispatch(self, chunk: List[Path]):
+        self.pool.apply_async(self.task, (chunk,),
+                              callback=lambda result: self._done.put((chunk, result, None)),
+                              error_callback=lambda error: self._done.put((chunk, None, error)))
+
+    def _scan_urgent_dir(self) -> bool:
+        """Enqueues the new settled pdfs of the urgent folder, True when some are still being written."""
+        if self.urgent_dir is None or not self.urgent_dir.is_dir():
+            return False
+        unsettled = False
+        new_paths = []
+        for path in self.urgent_dir.rglob("*.pdf"):
+            if path in self._seen:
+                continue
+            if time.time() - _mtime(path) < SETTLE_S:
+                unsettled = True
+            else:
+                new_paths.append(path)
+        if new_paths:
+            logger.info("%d urgent files enqueued.", len(new_paths))
+            self.add(new_paths, PRIORITY_URGENT)
+        return unsettled
+
+
+def _mtime(path: Path) -> float:
+    try:
+        return path.stat().st_mtime
+    except OSError:
+        return 0.0
+
+
+def priority_order(paths: List[Path], urgent_paths: Set[Path]) -> List[Path]:
+    """The order the scheduler processes paths in, for the serial mode."""
+    return sorted(paths, key=lambda p: (PRIORITY_URGENT if p in urgent_paths else PRIORITY_BULK, -_mtime(p)))
@@ -0,0 +1,201 @@
+import collections
+import concurrent.futures
+import datetime
+import functools
+import json
+import logging
+import queue
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Deque, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from insurancedb.api import PoolExtractor, Policy
+from insurancedb.extractors.options import ExtractionOptions
+from insurancedb.utils import chunk_even_groups
+
+logger = logging.getLogger(__name__)
+
+# latencies kept for the percentiles of /metrics
+LATENCY_WINDOW = 1000
+# how long a request waits for its result before the server answers 504
+REQUEST_TIMEOUT_S = 600
+
+
+def policy_to_json(policy: Policy) -> dict:
+    values = {field: value.isoformat() if isinstance(value, datetime.date) else value
+              for field, value in policy._asdict().items()}
+    values['insurance_months'] = policy.insurance_months
+    return values
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.batches = 0
+        self.batched_documents = 0
+        self.in_flight = 0
+        self.latencies: Deque[float] = collections.deque(maxlen=LATENCY_WINDOW)
+
+    def batch_dispatched(self, size: int):
+        with self._lock:
+            self.batches += 1
+            self.batched_documents += size
+            self.in_flight += size
+
+    def request_done(self, latency: float, failed: bool):
+        with self._lock:
+            self.requests += 1
+            self.errors += failed
+            self.in_flight -= 1
+            self.latencies.append(latency)
+
+    def to_json(self, queue_depth: int) -> dict:
+        with self._lock:
+            latencies = sorted(self.latencies)
+
+            def percentile(p):
+                return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 3) if latencies else None
+
+            return {'queue_depth': queue_depth, 'in_flight': self.in_flight, 'requests': self.requests,
+                    'errors': self.errors, 'batches': self.batches,
+                    'mean_batch_size': round(self.batched_documents / self.batches, 2) if self.batches else None,
+                    'latency_s': {'p50': percentile(0.5), 'p95': percentile(0.95), 'max': percentile(1.0)}}
+
+
+class MicroBatcher:
+    """
+    Coalesces the documents of concurrent requests: waits at most batch_wait_ms after the first queued document, or
+    until batch_size documents are queued, then splits the batch across the workers, one pool task per worker.
+    """
+
+    def __init__(self, pool: PoolExtractor, workers: int, batch_size: int, batch_wait_ms: int, metrics: Metrics):
+        self.pool = pool
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_wait_s = batch_wait_ms / 1000
+        self.metrics = metrics
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='batcher', daemon=True)
+        self._thread.start()
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def submit(self, data: bytes, file_name: str) -> concurrent.futures.Future:
+        future = concurrent.futures.Future()
+        self._queue.put((data, file_name, future, time.perf_counter()))
+        return future
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _next_batch(self) -> Optional[List[Tuple]]:
+        item = self._queue.get()
+        if item is None:
+            return None
+        batch = [item]
+        deadline = time.monotonic() + self.batch_wait_s
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self.metrics.batch_dispatched(len(batch))
+            for chunk in chunk_even_groups(batch, min(self.workers, len(batch))):
+                future = self.pool.submit_batch([(data, file_name) for data, file_name, _, _ in chunk])
+                future.add_done_callback(functools.partial(self._resolve, chunk))
+
+    def _resolve(self, chunk: List[Tuple], batch_future: concurrent.futures.Future):
+        try:
+            results = batch_future.result()
+        except Exception as e:
+            # the worker process died, every document of the chunk fails
+            results = [e] * len(chunk)
+        for (_, _, future, queued_at), result in zip(chunk, results):
+            failed = isinstance(result, Exception)
+            self.metrics.request_done(time.perf_counter() - queued_at, failed)
+            if failed:
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+class ExtractionRequestHandler(BaseHTTPRequestHandler):
+    """
+    POST /extract?file_name=<name>  body: the pdf bytes, the name may also be sent in the X-File-Name header
+    GET  /metrics
+    """
+    batcher: MicroBatcher = None
+    metrics: Metrics = None
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/extract':
+            return self._send_json(HTTPStatus.NOT_FOUND, {'error': f'unknown path {url.path}'})
+        file_name = parse_qs(url.query).get('file_name', [None])[0] or self.headers.get('X-File-Name')
+        length = int(self.headers.get('Content-Length') or 0)
+        if not file_name or length == 0:
+            return self._send_json(HTTPStatus.BAD_REQUEST,
+                                   {'error': 'the pdf is sent as the request body, with a file_name'})
+        data = self.rfile.read(length)
+        try:
+            policy = self.batcher.submit(data, file_name).result(timeout=REQUEST_TIMEOUT_S)
+        except concurrent.futures.TimeoutError:
+            return self._send_json(HTTPStatus.GATEWAY_TIMEOUT, {'file_name': file_name, 'error': 'timeout'})
+        except Exception as e:
+            return self._send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {'file_name': file_name, 'error': str(e)})
+        self._send_json(HTTPStatus.OK, {'file_name': file_name,
+                                        'policy': policy_to_json(policy) if policy is not None else None})
+
+    def do_GET(self):
+        if urlparse(self.path).path != '/metrics':
+            return self._send_json(HTTPStatus.NOT_FOUND, {'error': f'unknown path {self.path}'})
+        self._send_json(HTTPStatus.OK, self.metrics.to_json(self.batcher.queue_depth()))
+
+    def _send_json(self, status: HTTPStatus, body: dict):
+        payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        logger.debug("%s - " + format, self.address_string(), *args)
+
+
+def serve(host: str, port: int, workers: int, batch_size: int, batch_wait_ms: int,
+          options: Optional[ExtractionOptions] = None):
+    metrics = Metrics()
+    with PoolExtractor(options, workers) as pool:
+        batcher = MicroBatcher(pool, workers, batch_size, batch_wait_ms, metrics)
+        handler = type('Handler', (ExtractionRequestHandler,), {'batcher': batcher, 'metrics': metrics})
+        server = ThreadingHTTPServer((host, port), handler)
+        logger.info("Serving on http://%s:%d with %d workers.", host, server.server_port, workers)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            batcher.close()
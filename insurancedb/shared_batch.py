@@ -0,0 +1,131 @@
+import logging
+from multiprocessing import resource_tracker, shared_memory
+from typing import List, NamedTuple, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from insurancedb.exporters.normalize import ROW_COLUMNS, DATE_COLUMNS
+from insurancedb.row_batch import RowBatch, DICTIONARY_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+# ascii unit separator, does not occur in pdf text or paths
+TEXT_SEPARATOR = '\x1f'
+# buffer of the row counts of the documents, not a column
+ROW_COUNTS = 'row_counts'
+
+
+class BufferSpec(NamedTuple):
+    column: str
+    # 'values' of a date column or of the ROW_COUNTS, 'codes' of a dictionary column, 'missing' or 'text' of a text
+    # column
+    part: str
+    dtype: str
+    offset: int
+    length: int
+
+
+class SharedBatch(NamedTuple):
+    """
+    Handle of a RowBatch written to a shared memory segment, the only thing a worker sends back to the parent. Date
+    columns and dictionary codes are stored as is, text columns as one utf-8 blob of the values joined by
+    TEXT_SEPARATOR and a missing mask.
+    """
+    name: str
+    buffers: List[BufferSpec]
+    # categories of the dictionary columns, a handful of values each
+    categories: List[Tuple[str, list]]
+
+
+def share_batch(batch: RowBatch) -> Union[SharedBatch, RowBatch]:
+    """
+    Writes the batch to a new shared memory segment, the parent reads and unlinks it with receive_batch. The batch is
+    returned as is, to be pickled, when it can not be encoded or the segment can not be created, e.g. /dev/shm of a
+    container is too small.
+    """
+    try:
+        arrays, categories = _encode(batch)
+    except (TypeError, ValueError):
+        logger.warning("Could not encode the batch, it is pickled.", exc_info=True)
+        return batch
+    buffers = []
+    size = 0
+    for column, part, array in arrays:
+        # 8 byte aligned, so every buffer can be viewed in place
+        size += -size % 8
+        buffers.append(BufferSpec(column, part, array.dtype.str, size, len(array)))
+        size += array.nbytes
+    try:
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    except OSError:
+        logger.warning("Could not create a shared memory segment of %d bytes, the batch is pickled.", size,
+                       exc_info=True)
+        return batch
+    try:
+        for spec, (_, _, array) in zip(buffers, arrays):
+            np.ndarray(len(array), dtype=array.dtype, buffer=shm.buf, offset=spec.offset)[:] = array
+    finally:
+        shm.close()
+    return SharedBatch(shm.name, buffers, categories)
+
+
+def receive_batch(shared: Union[SharedBatch, RowBatch]) -> RowBatch:
+    if isinstance(shared, RowBatch):
+        return shared
+    shm = shared_memory.SharedMemory(name=shared.name)
+    try:
+        parts = {(spec.column, spec.part): np.ndarray(spec.length, dtype=spec.dtype, buffer=shm.buf,
+                                                      offset=spec.offset).copy()
+                 for spec in shared.buffers}
+    finally:
+        shm.close()
+        shm.unlink()
+    return _decode(parts, dict(shared.categories))
+
+
+def prepare_parent():
+    """
+    Starts the resource tracker before the pool forks, so workers and parent share it: a segment registered by a
+    worker is unregistered when the parent unlinks it, instead of being cleaned up when the worker exits.
+    """
+    resource_tracker.ensure_running()
+
+
+def _encode(batch: RowBatch) -> Tuple[List[Tuple[str, str, np.ndarray]], List[Tuple[str, list]]]:
+    arrays = []
+    categories = []
+    for name in ROW_COLUMNS:
+        values = batch.columns[name]
+        if name in DICTIONARY_COLUMNS:
+            arrays.append((name, 'codes', np.asarray(values.codes)))
+            categories.append((name, list(values.categories)))
+        elif name in DATE_COLUMNS:
+            arrays.append((name, 'values', values.view(np.int64)))
+        else:
+            missing = np.equal(values, None)
+            # str.join and str.split run in C, unlike building or slicing the values one by one
+            text = TEXT_SEPARATOR.join(np.where(missing, '', values).tolist())
+            if text.count(TEXT_SEPARATOR) != max(len(values) - 1, 0):
+                raise ValueError(f"A value of {name} contains the text separator.")
+            arrays.append((name, 'missing', missing.astype(np.bool_)))
+            arrays.append((name, 'text', np.frombuffer(text.encode('utf-8'), dtype=np.uint8)))
+    arrays.append((ROW_COUNTS, 'values', np.asarray(batch.row_counts)))
+    return arrays, categories
+
+
+def _decode(parts, categories) -> RowBatch:
+    columns = {}
+    for name in ROW_COLUMNS:
+        if name in DICTIONARY_COLUMNS:
+            columns[name] = pd.Categorical.from_codes(parts[(name, 'codes')], categories=categories[name])
+        elif name in DATE_COLUMNS:
+            columns[name] = parts[(name, 'values')].view('datetime64[D]')
+        else:
+            missing = parts[(name, 'missing')]
+            values = np.empty(len(missing), dtype=object)
+            if len(missing):
+                values[:] = parts[(name, 'text')].tobytes().decode('utf-8').split(TEXT_SEPARATOR)
+            values[missing] = None
+            columns[name] = values
+    return RowBatch(columns, parts[(ROW_COUNTS, 'values')])
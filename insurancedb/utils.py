@@ -1,4 +1,12 @@
+import os
+from multiprocessing import cpu_count
 from pathlib import Path
+from typing import Optional
+
+import click
+
+# memory of a worker besides its page renders: interpreter, pdfplumber, opencv and a tesseract process
+WORKER_BASE_MB = 300
 
 
 def get_project_root() -> Path:
@@ -8,4 +16,40 @@ def get_project_root() -> Path:
 def chunk_even_groups(lst, n_groups):
     approx_sizes = len(lst) / n_groups
     for i in range(n_groups):
-        yield lst[int(i * approx_sizes):int((i + 1) * approx_sizes)]
\ No newline at end of file
+        yield lst[int(i * approx_sizes):int((i + 1) * approx_sizes)]
+
+
+def available_memory_mb() -> Optional[int]:
+    """MemAvailable of /proc/meminfo, the free physical memory where there is none, None when it is unknown."""
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') // (1024 * 1024)
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def pool_size(page_memory_mb: int) -> int:
+    """A worker per cpu, fewer when the available memory does not fit that many workers with their page renders."""
+    available = available_memory_mb()
+    if available is None:
+        return cpu_count()
+    return max(1, min(cpu_count(), available // (page_memory_mb + WORKER_BASE_MB)))
+
+
+class DefaultCommandGroup(click.Group):
+    """Runs default_command when the first argument is not a command name, `insurance-db <pdfs_dir>` keeps working."""
+
+    def __init__(self, *args, default_command: str = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.default_command = default_command
+
+    def parse_args(self, ctx, args):
+        if args and args[0] not in self.commands and args[0] != '--help':
+            args.insert(0, self.default_command)
+        return super().parse_args(ctx, args)
@@ -8,7 +8,7 @@ setup(
     install_requires=['pdfplumber==0.5.28', 'pandas', 'click>=8.0.1', 'pytesseract==0.3.8', 'pillow==8.4.0',
                       'opencv-python>=4.5.5', 'numpy>=1.21'],
     entry_points={
-        'console_scripts': ['insurance-db=insurancedb.main:create_db']
+        'console_scripts': ['insurance-db=insurancedb.main:cli']
     },
     license='MIT',
     package_data={'': ['resources/*.*']},
@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+
+import pytest
+
+from insurancedb import file_processor
+from insurancedb.extractors.base import BaseRcaExtractor
+from insurancedb.extractors.registry import ExtractorSpec
+
+HEADER = 'header'
+BODY = 'body'
+
+
+class HeaderExtractor(BaseRcaExtractor):
+    """Reads pages 0 and 2 like the Allianz extractor, a page is 'header' or 'body' instead of a parsed page."""
+
+    def __init__(self, file_name, pdf, options=None):
+        self.file_name = file_name
+        self.pdf = pdf
+        self.page = None
+
+    def confirm(self):
+        pages = self.pdf.pages
+        self.page = next((page for page in (0, 2) if page < len(pages) and pages[page] == HEADER), None)
+        return self.page is not None
+
+    def get_confirmed_page(self):
+        return self.page
+
+
+@pytest.fixture(autouse=True)
+def header_spec(monkeypatch):
+    spec = ExtractorSpec('HEADER', f"{__name__}:HeaderExtractor", (), (0, 2))
+    monkeypatch.setattr(file_processor, 'select_specs', lambda insurers=None: [spec])
+
+
+def policies(*pages):
+    return [(first, end) for first, end, _ in file_processor.find_policies('batch.pdf', SimpleNamespace(pages=pages))]
+
+
+def test_header_on_the_third_page_is_one_policy():
+    assert policies(BODY, BODY, HEADER) == [(0, 3)]
+
+
+def test_policies_with_the_header_on_the_third_page():
+    assert policies(BODY, BODY, HEADER, BODY, BODY, HEADER) == [(0, 3), (3, 6)]
+
+
+def test_policies_with_the_header_on_the_first_page():
+    assert policies(HEADER, BODY, HEADER, BODY) == [(0, 2), (2, 4)]